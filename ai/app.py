@@ -1,8 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
 import sys
+import json
 from dotenv import load_dotenv
-from src.graphs.dynamic_rag_graph import get_dynamic_rag_graph
+from src.graphs.dynamic_rag_graph import get_dynamic_rag_graph, restore_state, snapshot_state, stream_answer
+from src.rags.index_store import get_index_store, start_refresh_scheduler
+from src.rags.embeddings import get_embedding_stats
+from src.rags.advanced_rag_config import rag_stats
+from src.rags.answer_cache import answer_cache_stats
+from src.agents.query_router import get_query_router
+from src.agents.SQLQueryEvaluatorAgent import verdict_cache_stats
+from src.agents.llm_pool import llm_pool_stats, clear_llm_pool
+from src.agents.SQL_Agent import clear_agent_executors
+from src.agents.sql_query_cache import sql_cache_stats
+from src.agents.sql_query_log import query_log_stats
+from src.agents.query_cost import query_cost_stats
+from src.agents.aggregate_store import get_aggregate_store, start_aggregate_scheduler, aggregate_stats
+from src.sessions.session_store import create_session_store
+from src.sessions.session_locks import SessionLocks, SessionBusyError
 
 # Import shared logging system
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -28,6 +43,14 @@ app.config.update({
     'DEBUG': server_config.get('debug', False) if server_config else False
 })
 
+# Agregaty transakcji budujemy przed grafem, żeby agent SQL dostał je w schemacie od pierwszego pytania
+try:
+    if (aggregate_store := get_aggregate_store()) is not None:
+        aggregate_store.refresh()
+        start_aggregate_scheduler()
+except Exception as aggregate_error:
+    logger.warning(f"Transaction aggregates not built: {str(aggregate_error)}")
+
 try:
     # Get RAG configuration
     rag_enabled = config_manager.get("rag", "enabled", default=True)
@@ -36,6 +59,13 @@ try:
     if rag_enabled:
         graph = get_dynamic_rag_graph()
         logger.info("Dynamic RAG graph initialized successfully")
+
+        # Wczytaj zapisany indeks transakcji przy starcie (budowa nastąpi przy pierwszym użyciu)
+        try:
+            get_index_store().load()
+            start_refresh_scheduler()
+        except Exception as index_error:
+            logger.warning(f"Transaction index not preloaded: {str(index_error)}")
     else:
         graph = None
         logger.info("RAG disabled in configuration")
@@ -43,7 +73,24 @@ except Exception as e:
     logger.error(f"Failed to initialize RAG graph: {str(e)}")
     graph = None
 
-session_states = {}
+# Stany sesji: ograniczone przez session.timeout / session.max_sessions, sprzątane w tle.
+# Zapisywana jest tylko serializowalna część stanu (session.backend: memory | sqlite)
+session_states = create_session_store()
+session_states.start_sweeper()
+
+# Żądania tej samej sesji wykonują się po kolei - bez wyścigu o stan i podwójnej pracy
+session_locks = SessionLocks.from_config()
+
+def reset_llm_clients():
+    """Zapomnij współdzielonych klientów LLM i zbudowanych na nich agentów SQL."""
+    clear_llm_pool()
+    clear_agent_executors()
+    logger.info("Shared LLM clients cleared - they will be recreated with the current configuration")
+
+def sse_event(data, event=None):
+    """Zakoduj zdarzenie Server-Sent Events."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 # Configuration endpoint
 @app.route('/config', methods=['GET'])
@@ -67,6 +114,7 @@ def reload_config():
     """Reload AI configuration."""
     try:
         config_manager.reload_config()
+        reset_llm_clients()
         logger.info("AI configuration reloaded")
         return jsonify({"success": True, "message": "Configuration reloaded"})
     except Exception as e:
@@ -89,6 +137,32 @@ def health_check():
         "llm_model": config_manager.get("llm", "model", default="gpt-4o-mini")
     })
 
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Statystyki wydajności serwisu AI (indeks, cache)."""
+    try:
+        index_store = get_index_store()
+        return jsonify({
+            "success": True,
+            "data": {
+                "index": index_store.manifest,
+                "embedding_cache": get_embedding_stats(),
+                "rag": rag_stats(),
+                "answer_cache": answer_cache_stats(),
+                "router": router.stats() if (router := get_query_router()) else None,
+                "verdict_cache": verdict_cache_stats(),
+                "query_cost": query_cost_stats(),
+                "llm_pool": llm_pool_stats(),
+                "sql_cache": sql_cache_stats(),
+                "aggregates": aggregate_stats(),
+                "query_log": query_log_stats(),
+                "sessions": {**session_states.stats(), "locks": session_locks.stats()},
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting stats: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -110,31 +184,26 @@ def chat():
 
         logger.info(f"Processing message for session {session_id}")
 
-        # Pobierz poprzedni stan lub zainicjalizuj nowy
-        prev_state = session_states.get(session_id, {
-            "graph_state": "START",
-            "rag": None,
-            "sql_agent": None,
-            "evaluate_sql_statement_agent": None,
-            "user_message": None,
-            "agent_response": None,
-            "rag_response": None,
-            "is_sql_query_heavy": None,
-        })
-        prev_state["user_message"] = message  # Aktualizuj wiadomość użytkownika
-
-        # Przetwórz stan przez graf
         try:
-            new_state = graph.invoke(prev_state)
-            session_states[session_id] = new_state
-            
+            with session_locks.hold(session_id):
+                # Pobierz poprzedni stan lub zainicjalizuj nowy
+                prev_state = restore_state(session_states.get(session_id))
+                prev_state["user_message"] = message  # Aktualizuj wiadomość użytkownika
+
+                # Przetwórz stan przez graf
+                new_state = graph.invoke(prev_state)
+                session_states.set(session_id, snapshot_state(new_state))
+
             response = new_state.get("rag_response") or new_state.get("agent_response") or "Brak odpowiedzi"
             logger.info(f"Generated response for session {session_id}")
             
             response_json = {"response": response, "status": "success"}
             logger.info(f"Sending response to backend for session {session_id}")
             return jsonify(response_json)
-            
+
+        except SessionBusyError as busy_error:
+            logger.warning(str(busy_error))
+            return jsonify({"error": "Session is busy, try again later"}), 429
         except Exception as graph_error:
             logger.error(f"Error processing graph for session {session_id}: {str(graph_error)}")
             return jsonify({"error": "Failed to process request"}), 500
@@ -143,6 +212,60 @@ def chat():
         logger.error(f"Unexpected error in chat endpoint: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Czat ze strumieniowaniem odpowiedzi jako Server-Sent Events: kolejne zdarzenia
+    data: {"token": ...}, na końcu event: end z pełną odpowiedzią lub event: error.
+    """
+    if not graph:
+        logger.error("RAG graph not available")
+        return jsonify({"error": "AI service not properly initialized"}), 503
+
+    data = request.get_json(silent=True)
+    if not data:
+        logger.warning("No JSON data received in chat stream request")
+        return jsonify({"error": "No data provided"}), 400
+
+    message = data.get('message')
+    session_id = data.get('session_id', 'default')
+
+    if not message or not message.strip():
+        logger.warning(f"Empty message received from session {session_id}")
+        return jsonify({"error": "Message is required and cannot be empty"}), 410
+
+    logger.info(f"Streaming response for session {session_id}")
+
+    def generate():
+        try:
+            with session_locks.hold(session_id):
+                state = restore_state(session_states.get(session_id))
+                state["user_message"] = message
+
+                new_state = state
+                for kind, payload in stream_answer(graph, state):
+                    if kind == "token":
+                        yield sse_event({"token": payload})
+                    else:
+                        new_state = payload
+                session_states.set(session_id, snapshot_state(new_state))
+
+            response = new_state.get("rag_response") or new_state.get("agent_response") or "Brak odpowiedzi"
+            logger.info(f"Streamed response for session {session_id}")
+            yield sse_event({"response": response, "status": "success"}, event="end")
+        except SessionBusyError as busy_error:
+            logger.warning(str(busy_error))
+            yield sse_event({"error": "Session is busy, try again later"}, event="error")
+        except Exception as graph_error:
+            logger.error(f"Error streaming graph for session {session_id}: {str(graph_error)}")
+            yield sse_event({"error": "Failed to process request"}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route('/clear', methods=['POST'])
 def clear_conversation():
     try:
@@ -150,9 +273,10 @@ def clear_conversation():
         session_id = data.get('session_id', 'default')
         logger.info(f"Clear called for session_id: {session_id}")
         
-        # Usuń stan tej sesji jeśli istnieje
-        if session_id in session_states:
-            del session_states[session_id]
+        # Usuń stan tej sesji jeśli istnieje (po zakończeniu trwającego żądania)
+        with session_locks.hold(session_id):
+            cleared = session_states.delete(session_id)
+        if cleared:
             logger.info(f"Session state cleared for: {session_id}")
         else:
             logger.info(f"No session state found for: {session_id}")
@@ -166,6 +290,19 @@ def clear_conversation():
         logger.error(f"/clear failed: {str(e)}")
         return jsonify({"error": "Failed to clear conversation"}), 500
 
+@app.route('/rag/refresh', methods=['POST'])
+def refresh_rag_index():
+    """Dołóż do indeksu nowe/zmienione transakcje i usuń skasowane."""
+    try:
+        data = request.get_json(silent=True) or {}
+        full = bool(data.get('full', False))
+        stats = get_index_store().refresh(full=full)
+        logger.info(f"Transaction index refreshed on demand (full={full}): {stats}")
+        return jsonify({"success": True, "data": stats})
+    except Exception as e:
+        logger.error(f"Error refreshing transaction index: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/config/provider', methods=['POST'])
 def change_provider():
     """Change AI provider (OpenAI/Gemini)."""
@@ -199,8 +336,8 @@ def change_provider():
         config_manager.save_config()
         
         # Clear session states to force recreation of agents with new provider
-        global session_states
         session_states.clear()
+        reset_llm_clients()
         logger.info("Session states cleared - agents will be recreated with new provider")
         
         logger.info(f"AI provider changed to: {provider}")
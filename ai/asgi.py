@@ -0,0 +1,206 @@
+"""
+Asynchroniczny tryb serwisu AI (ASGI).
+
+Endpointy czatu (/chat, /chat/stream, /clear) działają na pętli zdarzeń i korzystają
+ze ścieżek ainvoke/astream grafu, więc setki rozmów czekających na LLM nie zajmują
+wątków. Pozostałe endpointy (/config, /health, /stats, ...) obsługuje ta sama
+aplikacja Flask co w trybie synchronicznym.
+
+Uruchomienie: python asgi.py [--port PORT] albo hypercorn asgi:app
+"""
+import os
+import sys
+import asyncio
+
+from quart import Quart, Response, request, jsonify
+from hypercorn.middleware import AsyncioWSGIMiddleware
+
+# Wspólna inicjalizacja (graf, indeks, magazyn i blokady sesji) z trybu synchronicznego
+from app import (
+    app as flask_app,
+    config_manager,
+    graph,
+    logger,
+    session_locks,
+    session_states,
+    sse_event,
+)
+from src.graphs.dynamic_rag_graph import astream_answer, restore_state, snapshot_state
+from src.sessions.session_locks import SessionBusyError
+
+async_app = Quart(__name__)
+
+# Ścieżki obsługiwane asynchronicznie; reszta trafia do aplikacji Flask
+ASYNC_ROUTES = {"/chat", "/chat/stream", "/clear"}
+
+
+def _load_state(session_id, message):
+    # Odczyt sesji i podpięcie współdzielonego RAG mogą dotknąć dysku - wołane przez to_thread
+    state = restore_state(session_states.get(session_id))
+    state["user_message"] = message
+    return state
+
+
+async def _chat_request():
+    data = await request.get_json(silent=True)
+    if not data:
+        logger.warning("No JSON data received in chat request")
+        return None, None, (jsonify({"error": "No data provided"}), 400)
+
+    message = data.get('message')
+    session_id = data.get('session_id', 'default')
+
+    if not message or not message.strip():
+        logger.warning(f"Empty message received from session {session_id}")
+        return None, None, (jsonify({"error": "Message is required and cannot be empty"}), 410)
+    return message, session_id, None
+
+
+@async_app.route('/chat', methods=['POST'])
+async def chat():
+    try:
+        if not graph:
+            logger.error("RAG graph not available")
+            return jsonify({"error": "AI service not properly initialized"}), 503
+
+        message, session_id, error = await _chat_request()
+        if error:
+            return error
+
+        logger.info(f"Processing message for session {session_id}")
+
+        try:
+            async with session_locks.ahold(session_id):
+                prev_state = await asyncio.to_thread(_load_state, session_id, message)
+                new_state = await graph.ainvoke(prev_state)
+                await asyncio.to_thread(session_states.set, session_id, snapshot_state(new_state))
+
+            response = new_state.get("rag_response") or new_state.get("agent_response") or "Brak odpowiedzi"
+            logger.info(f"Generated response for session {session_id}")
+            return jsonify({"response": response, "status": "success"})
+
+        except SessionBusyError as busy_error:
+            logger.warning(str(busy_error))
+            return jsonify({"error": "Session is busy, try again later"}), 429
+        except Exception as graph_error:
+            logger.error(f"Error processing graph for session {session_id}: {str(graph_error)}")
+            return jsonify({"error": "Failed to process request"}), 500
+
+    except Exception as e:
+        logger.error(f"Unexpected error in chat endpoint: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@async_app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Czat ze strumieniowaniem odpowiedzi (Server-Sent Events), jak w trybie synchronicznym."""
+    if not graph:
+        logger.error("RAG graph not available")
+        return jsonify({"error": "AI service not properly initialized"}), 503
+
+    message, session_id, error = await _chat_request()
+    if error:
+        return error
+
+    logger.info(f"Streaming response for session {session_id}")
+
+    async def generate():
+        try:
+            async with session_locks.ahold(session_id):
+                state = await asyncio.to_thread(_load_state, session_id, message)
+
+                new_state = state
+                async for kind, payload in astream_answer(graph, state):
+                    if kind == "token":
+                        yield sse_event({"token": payload})
+                    else:
+                        new_state = payload
+                await asyncio.to_thread(session_states.set, session_id, snapshot_state(new_state))
+
+            response = new_state.get("rag_response") or new_state.get("agent_response") or "Brak odpowiedzi"
+            logger.info(f"Streamed response for session {session_id}")
+            yield sse_event({"response": response, "status": "success"}, event="end")
+        except SessionBusyError as busy_error:
+            logger.warning(str(busy_error))
+            yield sse_event({"error": "Session is busy, try again later"}, event="error")
+        except Exception as graph_error:
+            logger.error(f"Error streaming graph for session {session_id}: {str(graph_error)}")
+            yield sse_event({"error": "Failed to process request"}, event="error")
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@async_app.route('/clear', methods=['POST'])
+async def clear_conversation():
+    try:
+        data = await request.get_json(silent=True) or {}
+        session_id = data.get('session_id', 'default')
+        logger.info(f"Clear called for session_id: {session_id}")
+
+        async with session_locks.ahold(session_id):
+            cleared = await asyncio.to_thread(session_states.delete, session_id)
+        if cleared:
+            logger.info(f"Session state cleared for: {session_id}")
+        else:
+            logger.info(f"No session state found for: {session_id}")
+
+        return jsonify({
+            "status": "conversation cleared",
+            "success": True,
+            "session_id": session_id
+        })
+    except Exception as e:
+        logger.error(f"/clear failed: {str(e)}")
+        return jsonify({"error": "Failed to clear conversation"}), 500
+
+
+class ServiceDispatcher:
+    """Kieruje ścieżki czatu do aplikacji asynchronicznej, a resztę do Flask (WSGI w puli wątków)."""
+
+    def __init__(self, async_app, wsgi_app, async_routes):
+        self.async_app = async_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app)
+        self.async_routes = async_routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].rstrip("/") in self.async_routes:
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+
+app = ServiceDispatcher(async_app, flask_app, ASYNC_ROUTES)
+
+
+if __name__ == '__main__':
+    import argparse
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    try:
+        server_config = config_manager.get_server_config()
+
+        parser = argparse.ArgumentParser(description="Start AI service (async mode)")
+        parser.add_argument('--port', type=int, help="Port to run the AI service on")
+        args = parser.parse_args()
+
+        port = (args.port if args.port
+                else server_config.get('port', int(os.getenv('AI_PORT', 5001))))
+        host = server_config.get('host', '0.0.0.0')
+
+        hypercorn_config = Config()
+        hypercorn_config.bind = [f"{host}:{port}"]
+
+        logger.info(f"Starting AI service in async mode on {host}:{port}")
+        asyncio.run(serve(app, hypercorn_config))
+    except KeyboardInterrupt:
+        logger.info("AI service stopped by user")
+    except Exception as e:
+        logger.error(f"Failed to start AI service: {str(e)}")
+        sys.exit(1)
+    finally:
+        config_manager.stop_watching()
@@ -1,5 +1,9 @@
 import sys
 import os
+import re
+import time
+import asyncio
+import threading
 
 # Użyj lokalnego systemu AI
 ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -7,47 +11,158 @@ if ai_root not in sys.path:
     sys.path.insert(0, ai_root)
 
 from src.agents.basic_agent import BasicAgent
-from src.agents.table_structures import ALL_TRANSACTIONS_TABLE_STRUCTURE
+from src.agents.table_structures import ALL_TRANSACTIONS_TABLE_STRUCTURE, AGGREGATE_TABLES_STRUCTURE
+from src.agents.transactions_db import available_aggregates_path
+from src.agents.sql_query_cache import canonicalize_sql
+from src.agents.query_cost import get_query_cost_estimator
+from src.utils.ttl_cache import TTLCache
+from src.utils.normalization import normalize_question
 from config.logging import get_logger
+from config.config_manager import get_ai_config
 
 logger = get_logger(__name__)
 
+# Szkic SQL z odpowiedzi modelu: od pierwszego SELECT/WITH, bez bloku ``` na końcu
+DRAFT_SQL_PATTERN = re.compile(r"\b(?:WITH|SELECT)\b.*", re.IGNORECASE | re.DOTALL)
+
+# Werdykty współdzielone przez wszystkie sesje: (pytanie znormalizowane, provider, model[, wersja bazy]) -> YES/NO
+_config = get_ai_config()
+_verdict_cache = TTLCache(
+    max_size=_config.get("agents", "evaluator_agent", "verdict_cache_size", default=1000),
+    ttl=_config.get("agents", "evaluator_agent", "verdict_cache_ttl", default=3600),
+)
+_verdict_latency = {"llm_calls": 0, "llm_seconds": 0.0, "saved_seconds": 0.0}
+_verdict_latency_lock = threading.Lock()
+
+
+def verdict_cache_stats():
+    """Statystyki cache werdyktów: trafienia i zaoszczędzony czas wywołań LLM."""
+    stats = _verdict_cache.stats()
+    with _verdict_latency_lock:
+        calls = _verdict_latency["llm_calls"]
+        stats["avg_llm_latency_ms"] = round(_verdict_latency["llm_seconds"] / calls * 1000, 1) if calls else 0.0
+        stats["saved_latency_s"] = round(_verdict_latency["saved_seconds"], 3)
+    return stats
+
 class SQLQueryEvaluatorAgent(BasicAgent):
     def __init__(self):
         try:
             super().__init__()
             self.table_schema = ALL_TRANSACTIONS_TABLE_STRUCTURE
+            # Z estymatorem werdykt wynika z planu szkicu SQL, bez niego - z pytania (YES/NO od LLM)
+            self.cost_estimator = get_query_cost_estimator()
             logger.info("SQLQueryEvaluatorAgent initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize SQLQueryEvaluatorAgent: {str(e)}")
             raise
 
-    def is_query_heavy(self, user_question):
-        try:
-            if not user_question or not user_question.strip():
-                logger.warning("Empty question provided to SQLQueryEvaluatorAgent")
-                return "NO"
-                
-            logger.info(f"Evaluating query complexity for: {user_question[:50]}...")
-            
-            system_message = (
-                "You are an expert SQL database administrator. "
-                "Given the following table schema and a user's question, answer YES if the question is likely to generate a heavy SQL query "
-                "(e.g. a query that scans the whole table, lacks WHERE or LIMIT, or returns a large dataset), "
-                "otherwise answer NO. Only answer YES or NO.\n\n"
-                f"Table schema:\n{self.table_schema}\n\n"
+    def _cached_verdict(self, cache_key):
+        cached = _verdict_cache.get(cache_key)
+        if cached is not None:
+            with _verdict_latency_lock:
+                calls = _verdict_latency["llm_calls"]
+                if calls:
+                    _verdict_latency["saved_seconds"] += _verdict_latency["llm_seconds"] / calls
+            logger.info(f"Query complexity verdict served from cache: {cached}")
+        return cached
+
+    def _cache_key(self, user_question):
+        key = (normalize_question(user_question), self.provider, self.default_model)
+        # Koszt planu zależy od danych i indeksów - zmiana bazy unieważnia werdykt
+        return key + (self.cost_estimator.version(),) if self.cost_estimator is not None else key
+
+    def _evaluation_prompt(self, user_question):
+        if self.cost_estimator is not None:
+            summary_schema = (AGGREGATE_TABLES_STRUCTURE
+                              if available_aggregates_path(self.cost_estimator.db_path) else "")
+            return (
+                "You are an expert SQLite developer. "
+                "Write the single SQLite SELECT query over the tables below that best answers the user's question. "
+                "Return only the SQL, without explanation or markdown.\n\n"
+                f"Table `all_transactions`:\n{self.table_schema}\n{summary_schema}\n"
                 f"User question:\n{user_question}"
             )
-            response = self.llm.invoke(system_message)
-            result = response.content.strip().upper()
-            
+        return (
+            "You are an expert SQL database administrator. "
+            "Given the following table schema and a user's question, answer YES if the question is likely to generate a heavy SQL query "
+            "(e.g. a query that scans the whole table, lacks WHERE or LIMIT, or returns a large dataset), "
+            "otherwise answer NO. Only answer YES or NO.\n\n"
+            f"Table schema:\n{self.table_schema}\n\n"
+            f"User question:\n{user_question}"
+        )
+
+    def _verdict(self, response):
+        """YES/NO z odpowiedzi modelu: koszt planu szkicu SQL albo bezpośredni werdykt."""
+        content = response.content.strip()
+        if self.cost_estimator is None:
+            result = content.upper()
             # Ensure we only return YES or NO
             if result not in ["YES", "NO"]:
                 logger.warning(f"Unexpected response from evaluator: {result}, defaulting to NO")
                 result = "NO"
-                
-            logger.info(f"Query complexity evaluation result: {result}")
             return result
+
+        match = DRAFT_SQL_PATTERN.search(content)
+        if match is None:
+            logger.warning(f"Evaluator did not return SQL: {content[:80]}, defaulting to NO")
+            return "NO"
+        sql = canonicalize_sql(match.group(0).split("```")[0])
+        try:
+            cost = self.cost_estimator.estimate(sql)
+        except Exception as e:
+            logger.warning(f"Could not estimate draft SQL cost ({str(e)}), defaulting to NO")
+            return "NO"
+        logger.info(f"Draft SQL cost: {cost['rows_scanned']} rows scanned, result rows {cost['result_rows']}, "
+                    f"indexes used: {cost['uses_index']}, full scans: {cost['full_scans']}")
+        return "YES" if cost["heavy"] else "NO"
+
+    def _store_verdict(self, cache_key, result, elapsed):
+        with _verdict_latency_lock:
+            _verdict_latency["llm_calls"] += 1
+            _verdict_latency["llm_seconds"] += elapsed
+
+        _verdict_cache.set(cache_key, result)
+        logger.info(f"Query complexity evaluation result: {result}")
+        return result
+
+    def is_query_heavy(self, user_question):
+        try:
+            if not user_question or not user_question.strip():
+                logger.warning("Empty question provided to SQLQueryEvaluatorAgent")
+                return "NO"
+                
+            cache_key = self._cache_key(user_question)
+            cached = self._cached_verdict(cache_key)
+            if cached is not None:
+                return cached
+
+            logger.info(f"Evaluating query complexity for: {user_question[:50]}...")
+            start = time.perf_counter()
+            response = self.llm.invoke(self._evaluation_prompt(user_question))
+            elapsed = time.perf_counter() - start
+            return self._store_verdict(cache_key, self._verdict(response), elapsed)
+        except Exception as e:
+            logger.error(f"Error in SQLQueryEvaluatorAgent: {str(e)}")
+            return "NO"  # Default to light query on error
+
+    async def ais_query_heavy(self, user_question):
+        """Asynchroniczny odpowiednik is_query_heavy - nie blokuje wątku na czas wywołania LLM."""
+        try:
+            if not user_question or not user_question.strip():
+                logger.warning("Empty question provided to SQLQueryEvaluatorAgent")
+                return "NO"
+
+            cache_key = await asyncio.to_thread(self._cache_key, user_question)
+            cached = self._cached_verdict(cache_key)
+            if cached is not None:
+                return cached
+
+            logger.info(f"Evaluating query complexity for: {user_question[:50]}...")
+            start = time.perf_counter()
+            response = await self.llm.ainvoke(self._evaluation_prompt(user_question))
+            elapsed = time.perf_counter() - start
+            # EXPLAIN QUERY PLAN na bazie - poza pętlą zdarzeń
+            return self._store_verdict(cache_key, await asyncio.to_thread(self._verdict, response), elapsed)
         except Exception as e:
             logger.error(f"Error in SQLQueryEvaluatorAgent: {str(e)}")
-            return "NO"  # Default to light query on error
\ No newline at end of file
+            return "NO"  # Default to light query on error
@@ -1,5 +1,7 @@
 import os
 import sys
+import hashlib
+import threading
 
 # Użyj lokalnego systemu AI
 ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -8,14 +10,77 @@ if ai_root not in sys.path:
 
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.prompts import PromptTemplate
-from langchain_community.utilities import SQLDatabase
-from langchain_community.tools import QuerySQLDatabaseTool
 from src.agents.basic_agent import BasicAgent
-from src.agents.table_structures import ALL_TRANSACTIONS_TABLE_STRUCTURE
+from src.agents.table_structures import ALL_TRANSACTIONS_TABLE_STRUCTURE, AGGREGATE_TABLES_STRUCTURE
+from src.agents.transactions_db import get_transactions_db, db_path_from_uri, available_aggregates_path
+from src.agents.sql_query_cache import CachedQuerySQLDatabaseTool
+from src.agents.sql_query_log import get_query_log
+from src.utils.single_flight import SingleFlight
 from config.logging import get_logger
+from config.config_manager import get_ai_config
 
 logger = get_logger(__name__)
 
+AGENT_ERROR_RESPONSE = "I apologize, but I encountered an error while processing your request. Please try again or rephrase your question."
+
+_executors = {}
+_executors_lock = threading.Lock()
+_executors_flight = SingleFlight()
+
+
+def clear_agent_executors():
+    """Usuń skompilowanych agentów (trzymają klientów LLM) - np. po wyczyszczeniu puli LLM."""
+    with _executors_lock:
+        _executors.clear()
+
+
+def schema_version(table_schema):
+    """Krótki skrót schematu - zmiana opisu tabeli unieważnia skompilowanych agentów."""
+    return hashlib.sha1(table_schema.encode("utf-8")).hexdigest()[:12]
+
+
+def build_sql_prompt(table_schema, summary_schema=""):
+    if summary_schema:
+        tables_intro = ("Raw transactions are in the table `all_transactions`; summary tables are described below.\n"
+                        "            Always use only these tables and their columns. Do not try to use or guess any other table or column names.")
+        summary_hint = ("**For totals, sums and counts per day/month, account, currency or counterparty, "
+                        "query `daily_totals`/`monthly_totals` instead of aggregating `all_transactions`.**")
+    else:
+        tables_intro = ("This database contains only one table: `all_transactions`.\n"
+                        "            Always use only this table and its columns. Do not try to use or guess any other table or column names.")
+        summary_hint = ""
+
+    system_message = f"""
+            You are a helpful assistant with access to a SQLite database. {tables_intro}
+
+            {table_schema}
+            {summary_schema}
+            Important conventions:
+            - Negative amounts mean expenses, positive amounts mean income.
+            - BLIK transactions can be found by the phrase 'BLIK' in the `remittance_info_unstructured` column.
+            - Dates are in ISO format (e.g., '2025-04-30').
+            - Full transaction data is available in the `raw_data` column as JSON.
+
+            **If the user asks for recent transactions, always sort by the `booking_date` column in descending order.**
+            **Never check for other tables or columns – always use only the above.**
+            {summary_hint}
+            """
+
+    return PromptTemplate.from_template(
+        system_message + "\n\n"
+        "You are a helpful assistant. Use the tools below to assist you in answering the question.\n\n"
+        "Available tools:\n{tool_names}\n\n"
+        "Tools:\n{tools}\n\n"
+        "When providing a response, follow this format:\n"
+        "Action: <tool_name>\n"
+        "Action Input: <input_for_tool>\n\n"
+        "If no action is needed, respond with:\n"
+        "Final Answer: <your_answer>\n\n"
+        "Question:\n{input}\n\n"
+        "Use the tools as needed to provide a helpful response:\n{agent_scratchpad}"
+    )
+
+
 class SQL_Agent(BasicAgent):
     """Klasa serwisu do interakcji z API OpenAI"""
 
@@ -26,15 +91,62 @@ class SQL_Agent(BasicAgent):
             if not db_uri:
                 logger.error("Database URI not provided")
                 raise ValueError("Database URI is required")
-                
-            db = SQLDatabase.from_uri(db_uri)
+
+            self.db_uri = db_uri
             self.table_schema = ALL_TRANSACTIONS_TABLE_STRUCTURE
-            super().__init__(tools=[QuerySQLDatabaseTool(db=db)])
+            # Tabele agregatów trafiają do promptu dopiero, gdy plik agregatów istnieje
+            db_path = os.path.abspath(db_path_from_uri(db_uri))
+            self.summary_schema = AGGREGATE_TABLES_STRUCTURE if available_aggregates_path(db_path) else ""
+            super().__init__()
+            self.agent_executor = self._get_agent_executor()
+            self.tools = self.agent_executor.tools
             logger.info("SQL Agent initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize SQL Agent: {str(e)}")
             raise
 
+    def _get_agent_executor(self):
+        """
+        Pobierz skompilowany AgentExecutor dla (klient LLM, baza, schemat) - budowany raz
+        i współdzielony przez wszystkie tury i sesje; zmienia się tylko wejście.
+        """
+        # Klient z puli jest osobny dla każdego klucza API, więc executor nie przenosi cudzych poświadczeń;
+        # executor trzyma referencję do klienta, więc id nie zostanie ponownie użyte, dopóki wpis istnieje
+        key = (self.provider, self.default_model, self.default_temperature, id(self.llm),
+               self.db_uri, schema_version(self.table_schema + self.summary_schema))
+        with _executors_lock:
+            agent_executor = _executors.get(key)
+        if agent_executor is None:
+            # Kompilacja (odbicie schematu, prompt) raz na klucz - równoległe sesje czekają na wynik
+            agent_executor = _executors_flight.do(key, lambda: self._compile_agent_executor(key))
+        return agent_executor
+
+    def _compile_agent_executor(self, key):
+        with _executors_lock:
+            if key in _executors:
+                return _executors[key]
+        db = get_transactions_db(self.db_uri)
+        # Wyniki powtarzanych SELECT-ów wracają z cache do czasu zmiany pliku bazy
+        db_path = os.path.abspath(db_path_from_uri(self.db_uri))
+        tools = [CachedQuerySQLDatabaseTool(
+            db=db,
+            db_path=db_path,
+            aggregates_path=available_aggregates_path(db_path),
+            max_result_chars=get_ai_config().get("database", "query_cache_max_chars", default=100000),
+            query_log=get_query_log(db_path),
+        )]
+        prompt = build_sql_prompt(self.table_schema, self.summary_schema)
+        agent_executor = AgentExecutor.from_agent_and_tools(
+            agent=create_react_agent(self.llm, tools, prompt),
+            tools=tools,
+            verbose=False,  # Changed from True to reduce noise
+            handle_parsing_errors=True,
+        )
+        with _executors_lock:
+            _executors[key] = agent_executor
+        logger.info(f"Compiled SQL agent executor for {self.provider}/{self.default_model}")
+        return agent_executor
+
     def get_agent_response(self, human_message):
         """
         Uzyskaj odpowiedź używając agenta ReAct z narzędziami Supabase
@@ -45,49 +157,30 @@ class SQL_Agent(BasicAgent):
                 return "Please provide a valid question."
                 
             logger.info(f"Processing message with SQL Agent: {human_message[:50]}...")
-            
-            system_message = f"""
-            You are a helpful assistant with access to a SQLite database. This database contains only one table: `all_transactions`.
-            Always use only this table and its columns. Do not try to use or guess any other table or column names.
 
-            {self.table_schema}
+            response = self.agent_executor.invoke({"input": human_message})
+            result = response.get("output", "No response generated")
+            logger.info("SQL Agent response generated successfully")
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error in SQL Agent: {str(e)}")
+            return AGENT_ERROR_RESPONSE
 
-            Important conventions:
-            - Negative amounts mean expenses, positive amounts mean income.
-            - BLIK transactions can be found by the phrase 'BLIK' in the `remittance_info_unstructured` column.
-            - Dates are in ISO format (e.g., '2025-04-30').
-            - Full transaction data is available in the `raw_data` column as JSON.
+    async def aget_agent_response(self, human_message):
+        """Asynchroniczny odpowiednik get_agent_response (AgentExecutor.ainvoke)."""
+        try:
+            if not human_message or not human_message.strip():
+                logger.warning("Empty message provided to SQL Agent")
+                return "Please provide a valid question."
 
-            **If the user asks for recent transactions, always sort by the `booking_date` column in descending order.**
-            **Never check for other tables or columns – always use only the above.**
-            """
-        
-            prompt = PromptTemplate.from_template(
-                system_message + "\n\n"
-                "You are a helpful assistant. Use the tools below to assist you in answering the question.\n\n"
-                "Available tools:\n{tool_names}\n\n"
-                "Tools:\n{tools}\n\n"
-                "When providing a response, follow this format:\n"
-                "Action: <tool_name>\n"
-                "Action Input: <input_for_tool>\n\n"
-                "If no action is needed, respond with:\n"
-                "Final Answer: <your_answer>\n\n"
-                "Question:\n{input}\n\n"
-                "Use the tools as needed to provide a helpful response:\n{agent_scratchpad}"
-            )
-        
-            agent_executor = AgentExecutor.from_agent_and_tools(
-                agent=create_react_agent(self.llm, self.tools, prompt),
-                tools=self.tools,
-                verbose=False,  # Changed from True to reduce noise
-                handle_parsing_errors=True,
-            )
-        
-            response = agent_executor.invoke({"input": human_message})
+            logger.info(f"Processing message with SQL Agent: {human_message[:50]}...")
+
+            response = await self.agent_executor.ainvoke({"input": human_message})
             result = response.get("output", "No response generated")
             logger.info("SQL Agent response generated successfully")
             return result
-        
+
         except Exception as e:
             logger.error(f"Error in SQL Agent: {str(e)}")
-            return "I apologize, but I encountered an error while processing your request. Please try again or rephrase your question."
\ No newline at end of file
+            return AGENT_ERROR_RESPONSE
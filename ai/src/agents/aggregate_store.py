@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from src.agents.transactions_db import aggregates_path_for, register_row_checksum, resolve_transactions_db_path
+from src.agents.sql_query_cache import db_version_stamp
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+AGGREGATE_TABLES = {"daily_totals": ("day", 10), "monthly_totals": ("month", 7)}
+
+# Suma kontrolna kolumn, od których zależą agregaty - edycja daty, konta, waluty,
+# kontrahenta albo kwoty zmienia ją nawet przy tej samej liczbie wierszy i sumie kwot
+GROUPED_CHECKSUM_SQL = (
+    "SUM(row_checksum(booking_date, booking_date_time, account_id, currency, "
+    "creditor_name, debtor_name, amount))"
+)
+
+# Kontrahent: wierzyciel dla wydatków, dłużnik dla wpływów
+COUNTERPARTY_SQL = (
+    "COALESCE(NULLIF(TRIM(CASE WHEN amount < 0 THEN creditor_name ELSE debtor_name END), ''), '(unknown)')"
+)
+
+
+def _create_table_sql(table, period):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} ("
+        f"{period} TEXT NOT NULL, "
+        "account_id TEXT NOT NULL, "
+        "currency TEXT NOT NULL, "
+        "counterparty TEXT NOT NULL, "
+        "direction TEXT NOT NULL, "
+        "total REAL NOT NULL, "
+        "tx_count INTEGER NOT NULL, "
+        f"PRIMARY KEY ({period}, account_id, currency, counterparty, direction))"
+    )
+
+
+def _upsert_sql(table, period, length):
+    return (
+        f"INSERT INTO {table} ({period}, account_id, currency, counterparty, direction, total, tx_count) "
+        f"SELECT substr(COALESCE(booking_date, booking_date_time), 1, {length}), "
+        "COALESCE(account_id, ''), COALESCE(currency, ''), "
+        f"{COUNTERPARTY_SQL}, "
+        "CASE WHEN amount < 0 THEN 'expense' ELSE 'income' END, "
+        "TOTAL(amount), COUNT(*) "
+        "FROM src.all_transactions WHERE id > ? AND id <= ? "
+        "GROUP BY 1, 2, 3, 4, 5 "
+        f"ON CONFLICT ({period}, account_id, currency, counterparty, direction) DO UPDATE SET "
+        "total = total + excluded.total, tx_count = tx_count + excluded.tx_count"
+    )
+
+
+class TransactionAggregateStore:
+    """
+    Zmaterializowane agregaty all_transactions w osobnym pliku SQLite.
+
+    daily_totals i monthly_totals trzymają sumy i liczbę transakcji per
+    (okres, konto, waluta, kontrahent, kierunek). Odświeżanie dokłada tylko
+    wiersze powyżej znacznika id; gdy liczba, suma kwot albo suma kontrolna
+    grupowanych kolumn wierszy poniżej znacznika się zmieni (usunięcia, korekty
+    kwot, dat, kont czy kontrahentów), tabele są przeliczane od zera.
+    Plik jest dołączany (ATTACH) do połączeń agenta SQL tylko do odczytu.
+    """
+
+    def __init__(self, db_path, path=None):
+        self.db_path = os.path.abspath(db_path)
+        self.path = os.path.abspath(path or aggregates_path_for(self.db_path))
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.last_refresh_ms = None
+        self._source_stamp = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = register_row_checksum(sqlite3.connect(f"file:{self.path}", uri=True, timeout=30))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{self.db_path}?mode=ro",))
+        for table, (period, _) in AGGREGATE_TABLES.items():
+            conn.execute(_create_table_sql(table, period))
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_monthly_counterparty ON monthly_totals (counterparty, month)")
+        conn.execute("CREATE TABLE IF NOT EXISTS aggregate_state (key TEXT PRIMARY KEY, value)")
+        return conn
+
+    @staticmethod
+    def _state(conn):
+        state = dict(conn.execute("SELECT key, value FROM aggregate_state"))
+        checksum = state.get("covered_checksum")
+        return (int(state.get("high_water_mark", 0)), int(state.get("covered_rows", 0)),
+                float(state.get("covered_amount", 0.0)), int(checksum) if checksum is not None else None)
+
+    def refresh(self, full=False):
+        """Dołóż nowe wiersze do agregatów (albo przelicz je od zera). Zwraca statystyki odświeżenia."""
+        with self._lock:
+            stamp = db_version_stamp(self.db_path)
+            if not full and stamp == self._source_stamp:
+                return {"added": 0, "rebuilt": False}
+
+            start = time.perf_counter()
+            conn = self._connect()
+            try:
+                with conn:
+                    mark, covered_rows, covered_amount, covered_checksum = self._state(conn)
+                    new_mark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM src.all_transactions").fetchone()[0]
+                    rows, amount, checksum = conn.execute(
+                        f"SELECT COUNT(*), TOTAL(amount), COALESCE({GROUPED_CHECKSUM_SQL}, 0) "
+                        "FROM src.all_transactions WHERE id <= ?", (mark,)
+                    ).fetchone()
+                    # Stan bez sumy kontrolnej (starszy plik agregatów) daje jednorazowe przeliczenie
+                    rebuild = (full or rows != covered_rows or abs(amount - covered_amount) > 0.005
+                               or checksum != covered_checksum)
+                    if rebuild:
+                        for table in AGGREGATE_TABLES:
+                            conn.execute(f"DELETE FROM {table}")
+                        mark = 0
+                        self.rebuilds += 1
+
+                    for table, (period, length) in AGGREGATE_TABLES.items():
+                        conn.execute(_upsert_sql(table, period, length), (mark, new_mark))
+                    added, added_amount, added_checksum = conn.execute(
+                        f"SELECT COUNT(*), TOTAL(amount), COALESCE({GROUPED_CHECKSUM_SQL}, 0) "
+                        "FROM src.all_transactions WHERE id > ? AND id <= ?",
+                        (mark, new_mark),
+                    ).fetchone()
+
+                    covered_rows = (0 if rebuild else rows) + added
+                    covered_amount = (0.0 if rebuild else amount) + added_amount
+                    covered_checksum = (0 if rebuild else checksum) + added_checksum
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO aggregate_state (key, value) VALUES (?, ?)",
+                        [("high_water_mark", new_mark), ("covered_rows", covered_rows),
+                         ("covered_amount", covered_amount), ("covered_checksum", covered_checksum)],
+                    )
+            finally:
+                conn.close()
+
+            self._source_stamp = stamp
+            self.refreshes += 1
+            self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+            stats = {"added": added, "rebuilt": rebuild}
+            logger.info(f"Transaction aggregates refreshed in {self.last_refresh_ms}ms: {stats}")
+            return stats
+
+    def stats(self):
+        tables = {}
+        if os.path.exists(self.path):
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                for table in AGGREGATE_TABLES:
+                    tables[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.close()
+        return {
+            "path": self.path,
+            "tables": tables,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+            "last_refresh_ms": self.last_refresh_ms,
+        }
+
+
+# Globalna instancja
+_aggregate_store = None
+_aggregate_store_lock = threading.Lock()
+
+
+def get_aggregate_store():
+    """Pobierz globalny magazyn agregatów albo None, gdy database.aggregates jest wyłączone."""
+    global _aggregate_store
+    if not get_ai_config().get("database", "aggregates", default=True):
+        return None
+    with _aggregate_store_lock:
+        if _aggregate_store is None:
+            db_path = resolve_transactions_db_path()
+            if not db_path or not os.path.exists(db_path):
+                raise FileNotFoundError(f"Database file not found: {db_path}")
+            _aggregate_store = TransactionAggregateStore(db_path)
+        return _aggregate_store
+
+
+def aggregate_stats():
+    return _aggregate_store.stats() if _aggregate_store is not None else None
+
+
+_refresh_thread = None
+
+
+def start_aggregate_scheduler(interval=None):
+    """Uruchom wątek odświeżający agregaty co database.aggregates_refresh_interval sekund (0 = wyłączone)."""
+    global _refresh_thread
+    if interval is None:
+        interval = get_ai_config().get("database", "aggregates_refresh_interval", default=0)
+    if not interval or interval <= 0 or _refresh_thread is not None:
+        return None
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            try:
+                store = get_aggregate_store()
+                if store is not None:
+                    store.refresh()
+            except Exception as e:
+                logger.error(f"Scheduled aggregate refresh failed: {str(e)}")
+
+    _refresh_thread = threading.Thread(target=_run, name="aggregate-refresh", daemon=True)
+    _refresh_thread.start()
+    logger.info(f"Transaction aggregates refresh scheduled every {interval}s")
+    return _refresh_thread
@@ -6,8 +6,7 @@ ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 if ai_root not in sys.path:
     sys.path.insert(0, ai_root)
 
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.agents.llm_pool import get_llm
 from config.logging import get_logger
 from config.config_manager import get_ai_config
 
@@ -32,11 +31,7 @@ class BasicAgent:
                     logger.error("Google API key not found")
                     raise ValueError("Google API key is required for Gemini")
                 
-                self.llm = ChatGoogleGenerativeAI(
-                    google_api_key=self.api_key,
-                    model=self.default_model,
-                    temperature=self.default_temperature
-                )
+                self.llm = get_llm("gemini", self.default_model, self.default_temperature, self.api_key)
                 logger.info(f"BasicAgent initialized with Gemini model: {self.default_model}")
                 
             else:  # Default to OpenAI
@@ -48,11 +43,7 @@ class BasicAgent:
                     logger.error("OpenAI API key not found")
                     raise ValueError("OpenAI API key is required")
                 
-                self.llm = ChatOpenAI(
-                    api_key=self.api_key,
-                    model=self.default_model,
-                    temperature=self.default_temperature
-                )
+                self.llm = get_llm("openai", self.default_model, self.default_temperature, self.api_key)
                 logger.info(f"BasicAgent initialized with OpenAI model: {self.default_model}")
             
             self.tools = tools or []
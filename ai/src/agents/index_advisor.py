@@ -0,0 +1,241 @@
+"""
+Doradca indeksów dla bazy transakcji na podstawie dziennika zapytań agenta SQL.
+
+Analizuje zapytania z pełnym skanem tabeli (SCAN bez indeksu w EXPLAIN QUERY PLAN),
+proponuje indeksy (kolumny równości, potem zakresu albo sortowania, a gdy się
+mieszczą - pozostałe użyte kolumny, żeby indeks pokrywał zapytanie) i opcjonalnie
+zakłada je na zapisywalnej kopii bazy, mierząc czasy zapytań przed i po.
+
+Uruchomienie: python -m src.agents.index_advisor [--apply] [--output KOPIA.db]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import statistics
+import re
+from collections import OrderedDict
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from src.agents.transactions_db import (
+    AGGREGATES_SCHEMA,
+    available_aggregates_path,
+    connect_readonly,
+    resolve_transactions_db_path,
+)
+from src.agents.sql_query_cache import SQL_TOKEN_PATTERN
+from src.agents.sql_query_log import query_log_path_for, explain_query_plan, is_full_scan, resolve_table_alias
+from config.logging import get_logger
+
+logger = get_logger(__name__)
+
+WHERE_PATTERN = re.compile(r"\bWHERE\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bHAVING\b|\bLIMIT\b|\bUNION\b|$)",
+                           re.DOTALL)
+ORDER_BY_PATTERN = re.compile(r"\bORDER BY\b(.*?)(?=\bLIMIT\b|\)|$)", re.DOTALL)
+# Kolumny, których nie warto dokładać do indeksu pokrywającego
+WIDE_COLUMNS = {"raw_data", "remittance_info_array"}
+
+
+def _strip_literals(sql):
+    return "".join("?" if token[0] in "'\"" else token for token in SQL_TOKEN_PATTERN.findall(sql))
+
+
+def _mentions(text, column):
+    return re.search(rf"(?<![\w.]){column}\b|\.{column}\b", text, re.IGNORECASE) is not None
+
+
+def scanned_tables(sql, plan):
+    """Tabele czytane pełnym skanem wg kroków planu (alias z planu zamieniany na nazwę tabeli)."""
+    return [resolve_table_alias(sql, step.split()[1])
+            for step in plan if step.startswith("SCAN ") and " INDEX " not in step]
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def propose_index(sql, columns, max_columns=6):
+    """
+    Zaproponuj indeks dla zapytania skanującego tabelę o podanych kolumnach albo None.
+    Zwraca (kolumny klucza, dodatkowe kolumny pokrywające, czy indeks pokrywa zapytanie).
+    """
+    text = _strip_literals(sql)
+    where = " ".join(WHERE_PATTERN.findall(text))
+    order_by = " ".join(ORDER_BY_PATTERN.findall(text))
+
+    equality = [c for c in columns
+                if re.search(rf"(?<!\w){c}\s*(=|\bIN\b|\bIS\b)", where, re.IGNORECASE)]
+    ranges = [c for c in columns if c not in equality
+              and re.search(rf"(?<!\w){c}\s*(<|>|\bBETWEEN\b)", where, re.IGNORECASE)]
+    ordering = [c for c in columns if _mentions(order_by, c)]
+    ordering.sort(key=lambda c: order_by.upper().find(c.upper()))
+
+    key = equality + (ranges[:1] if ranges else [c for c in ordering if c not in equality])
+    if not key:
+        return None
+
+    referenced = [c for c in columns if _mentions(text, c)]
+    extras = [c for c in referenced if c not in key]
+    select_all = re.search(r"\bSELECT\s+(DISTINCT\s+)?\*", text, re.IGNORECASE) is not None
+    covering = (not select_all and not WIDE_COLUMNS & set(extras)
+                and len(key) + len(extras) <= max_columns)
+    return key, (extras if covering else []), covering
+
+
+def load_hotspots(log_path, limit=20):
+    """Zapytania z pełnym skanem posortowane wg łącznego czasu: (sql, wywołania, łączny ms, plan)."""
+    conn = sqlite3.connect(f"file:{log_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT sql, COUNT(*), TOTAL(duration_ms), "
+            "(SELECT plan FROM query_log AS latest WHERE latest.sql = query_log.sql ORDER BY id DESC LIMIT 1) "
+            "FROM query_log WHERE full_scan = 1 AND cached = 0 AND error IS NULL "
+            "GROUP BY sql ORDER BY 3 DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(sql, calls, total_ms, json.loads(plan or "[]")) for sql, calls, total_ms, plan in rows]
+
+
+def advise(db_path, log_path, limit=20, max_columns=6):
+    """Propozycje indeksów: lista słowników posortowana wg czasu zapytań, które by przyspieszyły."""
+    conn = connect_readonly(db_path)
+    try:
+        proposals = OrderedDict()
+        for sql, calls, total_ms, plan in load_hotspots(log_path, limit):
+            for table in scanned_tables(sql, plan):
+                columns = table_columns(conn, table)
+                if not columns:
+                    continue  # tabela spoza bazy transakcji (np. agregaty)
+                proposal = propose_index(sql, columns, max_columns)
+                if proposal is None:
+                    continue
+                key, extras, covering = proposal
+                index_columns = tuple(key + extras)
+                entry = proposals.setdefault((table.lower(), index_columns), {
+                    "table": table.lower(),
+                    "columns": list(index_columns),
+                    "covering": covering,
+                    "calls": 0,
+                    "total_ms": 0.0,
+                    "queries": [],
+                })
+                entry["calls"] += calls
+                entry["total_ms"] += total_ms
+                entry["queries"].append(sql)
+    finally:
+        conn.close()
+
+    result = sorted(proposals.values(), key=lambda p: p["total_ms"], reverse=True)
+    for proposal in result:
+        name = "idx_" + "_".join([proposal["table"], *proposal["columns"]])[:60]
+        proposal["name"] = name
+        proposal["statement"] = (f"CREATE INDEX IF NOT EXISTS {name} "
+                                 f"ON {proposal['table']} ({', '.join(proposal['columns'])})")
+    return result
+
+
+def _time_query(conn, sql, repeat):
+    timings = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def apply_on_copy(db_path, output_path, proposals, repeat=3):
+    """
+    Skopiuj bazę do output_path, załóż proponowane indeksy (+ ANALYZE) i zmierz
+    zapytania przed i po. Oryginalna baza nie jest modyfikowana.
+    """
+    if os.path.abspath(output_path) == os.path.abspath(db_path):
+        raise ValueError("Output path must differ from the transactions database")
+
+    source = connect_readonly(db_path)
+    target = sqlite3.connect(f"file:{os.path.abspath(output_path)}", uri=True)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+
+    try:
+        aggregates_path = available_aggregates_path(db_path)
+        if aggregates_path:
+            target.execute(f"ATTACH DATABASE ? AS {AGGREGATES_SCHEMA}", (f"file:{aggregates_path}?mode=ro",))
+        target.commit()
+
+        queries = list(OrderedDict.fromkeys(sql for p in proposals for sql in p["queries"]))
+        before = {sql: _time_query(target, sql, repeat) for sql in queries}
+        with target:
+            for proposal in proposals:
+                target.execute(proposal["statement"])
+            target.execute("ANALYZE main")
+        report = []
+        for sql in queries:
+            plan = explain_query_plan(target, sql)
+            report.append({
+                "sql": sql,
+                "before_ms": before[sql],
+                "after_ms": _time_query(target, sql, repeat),
+                "full_scan": is_full_scan(plan),
+                "plan": plan,
+            })
+        return report
+    finally:
+        target.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes from the SQL agent query log")
+    parser.add_argument("--db", help="Transactions database (default: database.path / transactions_db_path)")
+    parser.add_argument("--log", help="Query log file (default: <db>_query_log.db)")
+    parser.add_argument("--top", type=int, default=20, help="Number of hottest full-scan queries to analyze")
+    parser.add_argument("--max-columns", type=int, default=6, help="Maximum columns of a covering index")
+    parser.add_argument("--apply", action="store_true", help="Create the indexes on a writable copy of the database")
+    parser.add_argument("--output", help="Path of the indexed copy (default: <db>_indexed.db)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query when timing")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.abspath(args.db or resolve_transactions_db_path())
+    log_path = args.log or query_log_path_for(db_path)
+    if not os.path.exists(log_path):
+        print(f"Query log not found: {log_path}")
+        return 1
+
+    proposals = advise(db_path, log_path, limit=args.top, max_columns=args.max_columns)
+    result = {"proposals": proposals}
+    if args.apply and proposals:
+        output_path = args.output or f"{os.path.splitext(db_path)[0]}_indexed.db"
+        result["output"] = output_path
+        result["timings"] = apply_on_copy(db_path, output_path, proposals, repeat=args.repeat)
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0
+
+    if not proposals:
+        print("No full-scan hotspots with indexable predicates found.")
+        return 0
+    for proposal in proposals:
+        kind = "covering" if proposal["covering"] else "key"
+        print(f"{proposal['statement']};  -- {kind}, {proposal['calls']} calls, {proposal['total_ms']:.1f} ms total")
+    for timing in result.get("timings", []):
+        print(f"{timing['before_ms']:>10.3f} ms -> {timing['after_ms']:>10.3f} ms  "
+              f"{'SCAN' if timing['full_scan'] else 'INDEX'}  {timing['sql'][:100]}")
+    if "output" in result:
+        print(f"Indexed copy written to {result['output']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+import sys
+import asyncio
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+import httpx
+from langchain_openai import ChatOpenAI
+from langchain_google_genai import ChatGoogleGenerativeAI
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _create_llm(provider, model, temperature, api_key):
+    config = get_ai_config()
+    timeout = config.get("llm", "timeout", default=60)
+
+    if provider == "gemini":
+        # Klient Gemini też jest jeden na klucz, ale transport (gRPC/REST) zarządza połączeniami
+        # sam - llm.max_connections i llm.timeout go nie dotyczą
+        return ChatGoogleGenerativeAI(
+            google_api_key=api_key,
+            model=model,
+            temperature=temperature,
+        )
+
+    # Jedna pula połączeń keep-alive na klienta - współdzielona przez wszystkie sesje
+    max_connections = config.get("llm", "max_connections", default=20)
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return ChatOpenAI(
+        api_key=api_key,
+        model=model,
+        temperature=temperature,
+        timeout=timeout,
+        http_client=httpx.Client(limits=limits, timeout=timeout),
+        http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+
+
+def get_llm(provider, model, temperature, api_key):
+    """
+    Pobierz współdzielonego klienta LLM dla (provider, model, temperatura).
+
+    Klienci są tworzeni raz na proces i pożyczani przez agentów wszystkich sesji,
+    więc setki sesji korzystają z kilku rozgrzanych połączeń HTTP.
+    """
+    key = (provider, model, float(temperature), hash(api_key))
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            llm = _create_llm(provider, model, float(temperature), api_key)
+            _clients[key] = llm
+            logger.info(f"Created shared LLM client: {provider}/{model} (temperature={temperature})")
+        return llm
+
+
+def llm_pool_stats():
+    """Liczba współdzielonych klientów LLM w procesie."""
+    with _clients_lock:
+        return {
+            "clients": len(_clients),
+            "keys": [f"{provider}/{model}@{temperature}" for provider, model, temperature, _ in _clients],
+        }
+
+
+def clear_llm_pool():
+    """
+    Usuń klientów z rejestru i zamknij ich połączenia HTTP - wywoływane po zmianie providera
+    i przeładowaniu konfiguracji, żeby nowe ustawienia (timeout, max_connections, klucze API)
+    objęły kolejnych agentów, a stare pule połączeń nie wisiały do końca procesu.
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for llm in clients:
+        _close_llm(llm)
+
+
+def _close_llm(llm):
+    """Zamknij pule połączeń HTTP klienta (Gemini nie ma własnych klientów httpx)."""
+    http_client = getattr(llm, "http_client", None)
+    if http_client is not None:
+        try:
+            http_client.close()
+        except Exception as e:
+            logger.warning(f"Cannot close LLM HTTP client: {str(e)}")
+
+    http_async_client = getattr(llm, "http_async_client", None)
+    if http_async_client is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    try:
+        if loop is not None:
+            # Wywołanie z pętli zdarzeń (tryb ASGI) - zamknięcie w tle, bez blokowania pętli
+            loop.create_task(http_async_client.aclose())
+        else:
+            asyncio.run(http_async_client.aclose())
+    except Exception as e:
+        logger.warning(f"Cannot close LLM async HTTP client: {str(e)}")
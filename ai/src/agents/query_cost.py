@@ -0,0 +1,269 @@
+import os
+import sys
+import re
+import sqlite3
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from src.agents.transactions_db import (
+    AGGREGATES_SCHEMA,
+    available_aggregates_path,
+    connect_readonly,
+    resolve_transactions_db_path,
+)
+from src.agents.sql_query_cache import SQL_TOKEN_PATTERN, db_version_stamp
+from src.agents.sql_query_log import resolve_table_alias
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+SCAN_STEP = re.compile(r"^SCAN (\S+)(?: USING (?:COVERING )?INDEX (\S+))?")
+SEARCH_STEP = re.compile(r"^SEARCH (\S+) USING (?:(?:AUTOMATIC )?(?:COVERING )?INDEX (\S+)|INTEGER PRIMARY KEY|PRIMARY KEY)"
+                         r"(?: \((.*)\))?")
+# Wynik podzapytania FROM / CTE: "CO-ROUTINE m", "MATERIALIZE m" - czytany potem krokiem "SCAN m"
+DERIVED_STEP = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+# Podzapytania w WHERE / SELECT - czytają dane, ale nie dokładają wierszy do wyniku
+NESTED_SUBQUERY_STEP = re.compile(r"^(?:CORRELATED )?(?:SCALAR|LIST) SUBQUERY\b")
+CONSTANT_ROW_STEP = "SCAN CONSTANT ROW"
+AGGREGATE_PATTERN = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+LIMIT_PATTERN = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+GROUP_BY_PATTERN = re.compile(r"\bGROUP BY\b", re.IGNORECASE)
+WHERE_PATTERN = re.compile(r"\bWHERE\b", re.IGNORECASE)
+# Selektywność ograniczenia bez statystyk (jak domyślna heurystyka planisty SQLite dla nierówności)
+RANGE_SELECTIVITY = 0.25
+
+
+class QueryCostEstimator:
+    """
+    Szacuje koszt zapytania SQL na podstawie EXPLAIN QUERY PLAN i sqlite_stat1.
+
+    Dla każdego kroku planu liczy szacowaną liczbę czytanych wierszy: pełny skan
+    to liczba wierszy tabeli, wyszukiwanie indeksem - średnia liczba wierszy na
+    klucz ze statystyk indeksu (kolumny równości), podzielona przez 4 dla każdej
+    nierówności. Bez ANALYZE liczba wierszy tabeli pochodzi z MAX(rowid).
+    Zapytanie jest ciężkie, gdy czyta więcej niż max_scan_rows wierszy albo
+    zwróciłoby więcej niż max_result_rows wierszy (surowe dane zamiast podsumowania).
+
+    Kroki bez tabeli (CTE, podzapytania, SELECT bez FROM) nie są odpytywane
+    w bazie - ich liczba wierszy to suma kroków potomnych w drzewie planu.
+    """
+
+    def __init__(self, db_path, max_result_rows=200, max_scan_rows=1000000):
+        self.db_path = os.path.abspath(db_path)
+        self.max_result_rows = int(max_result_rows)
+        self.max_scan_rows = int(max_scan_rows)
+        self.estimates = 0
+        self.heavy = 0
+        self.failures = 0
+        self._stats = None
+        self._stats_version = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return connect_readonly(self.db_path, aggregates_path=available_aggregates_path(self.db_path))
+
+    def version(self):
+        """Wersja danych i statystyk (bazy i pliku agregatów) - zmiana unieważnia szacunki."""
+        aggregates_path = available_aggregates_path(self.db_path)
+        return db_version_stamp(self.db_path), db_version_stamp(aggregates_path) if aggregates_path else None
+
+    def _load_stats(self, conn):
+        """
+        {tabela: liczba wierszy} i {indeks: [wiersze, wiersze na klucz 1. kolumny, ...]} z sqlite_stat1
+        oraz zbiór nazw tabel i widoków ze sqlite_master (bazy i agregatów).
+        """
+        tables, indexes, names = {}, {}, set()
+        schemas = ["main"] + [row[1] for row in conn.execute("PRAGMA database_list") if row[1] == AGGREGATES_SCHEMA]
+        for schema in schemas:
+            schema_names = {name.lower() for (name,) in conn.execute(
+                f"SELECT name FROM {schema}.sqlite_master WHERE type IN ('table', 'view')"
+            )}
+            names.update(schema_names)
+            if "sqlite_stat1" not in schema_names:
+                continue
+            for table, index, stat in conn.execute(f"SELECT tbl, idx, stat FROM {schema}.sqlite_stat1"):
+                numbers = [int(part) for part in (stat or "").split() if part.isdigit()]
+                if not numbers:
+                    continue
+                tables[table.lower()] = numbers[0]
+                if index:
+                    indexes[index.lower()] = numbers
+        return tables, indexes, names
+
+    def _stats_for(self, conn):
+        version = self.version()
+        with self._lock:
+            if self._stats is None or self._stats_version != version:
+                self._stats = self._load_stats(conn)
+                self._stats_version = version
+            return self._stats
+
+    def _table_rows(self, conn, table, tables):
+        """Liczba wierszy tabeli z bazy - tylko dla nazw obecnych w sqlite_master."""
+        rows = tables.get(table.lower())
+        if rows is None:
+            try:
+                rows = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+            except sqlite3.Error:
+                rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            tables[table.lower()] = rows
+        return rows
+
+    def _search_rows(self, table_rows, index_stat, constraints):
+        if not constraints:
+            return table_rows
+        if "rowid=" in constraints:
+            return 1
+        equalities = len(re.findall(r"\w+=\?", constraints))
+        ranges = len(re.findall(r"\w+[<>]", constraints))
+        if equalities and index_stat and len(index_stat) > equalities:
+            rows = index_stat[equalities]
+        elif equalities:
+            rows = max(1, table_rows // 10)
+        else:
+            rows = table_rows
+        return max(1, int(rows * RANGE_SELECTIVITY ** min(ranges, 2)))
+
+    def _result_rows(self, text, rows_read):
+        """Szacowana liczba zwracanych wierszy albo None (GROUP BY - nieznana liczba grup)."""
+        limit = LIMIT_PATTERN.search(text)
+        if AGGREGATE_PATTERN.search(text) and not GROUP_BY_PATTERN.search(text):
+            rows = 1
+        elif GROUP_BY_PATTERN.search(text):
+            rows = None
+        else:
+            rows = rows_read
+        if limit:
+            rows = min(int(limit.group(1)), rows) if rows is not None else int(limit.group(1))
+        return rows
+
+    def estimate(self, sql):
+        """
+        Zwróć słownik z planem, szacowaną liczbą czytanych i zwracanych wierszy,
+        użyciem indeksów i werdyktem heavy. Błędny SQL podnosi sqlite3.Error.
+        """
+        text = "".join("?" if token[0] in "'\"" else token for token in SQL_TOKEN_PATTERN.findall(sql))
+        conn = self._connect()
+        try:
+            steps = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            tables, indexes, names = self._stats_for(conn)
+            children = {}
+            for step_id, parent, _, detail in steps:
+                children.setdefault(parent, []).append((step_id, detail))
+
+            derived = {}  # nazwa CTE / podzapytania FROM -> szacowana liczba wierszy
+            totals = {"scanned": 0, "uses_index": False, "full_scans": []}
+
+            def source_rows(name, step_id):
+                """Wiersze źródła kroku SCAN/SEARCH: tabela z bazy, wynik CTE albo kroki potomne."""
+                if name.lower() in derived:
+                    return derived[name.lower()], None
+                table = resolve_table_alias(sql, name)
+                if table.lower() in names:
+                    return self._table_rows(conn, table, tables), table
+                return read_rows(step_id), None
+
+            def read_rows(parent):
+                """Wiersze dostarczane przez kroki potomne parent (koszt czytania dolicza do totals)."""
+                rows_read = 0
+                for step_id, detail in children.get(parent, []):
+                    derived_step = DERIVED_STEP.match(detail)
+                    scan = SCAN_STEP.match(detail)
+                    search = SEARCH_STEP.match(detail)
+                    if derived_step:
+                        derived[derived_step.group(1).lower()] = read_rows(step_id)
+                    elif NESTED_SUBQUERY_STEP.match(detail):
+                        read_rows(step_id)
+                    elif detail == CONSTANT_ROW_STEP:
+                        rows_read += 1
+                    elif scan:
+                        rows, table = source_rows(scan.group(1), step_id)
+                        if scan.group(2):
+                            totals["uses_index"] = True
+                        elif table:
+                            totals["full_scans"].append(table.lower())
+                        totals["scanned"] += rows
+                        # Filtr bez indeksu: zwracana część tabeli wg heurystyki selektywności
+                        rows_read += int(rows * RANGE_SELECTIVITY) if table and WHERE_PATTERN.search(text) else rows
+                    elif search:
+                        rows, _ = source_rows(search.group(1), step_id)
+                        index_stat = indexes.get((search.group(2) or "").lower())
+                        rows = self._search_rows(rows, index_stat, search.group(3) or "")
+                        totals["uses_index"] = True
+                        totals["scanned"] += rows
+                        rows_read += rows
+                    else:
+                        # Zapytania złożone (UNION), sortowanie itp. - wiersze kroków potomnych
+                        rows_read += read_rows(step_id)
+                return rows_read
+
+            rows_read = read_rows(0)
+            plan = [detail for _, _, _, detail in steps]
+        except sqlite3.Error:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            conn.close()
+
+        rows_scanned, uses_index, full_scans = totals["scanned"], totals["uses_index"], totals["full_scans"]
+        result_rows = self._result_rows(text, rows_read)
+        heavy = rows_scanned > self.max_scan_rows or (result_rows is not None and result_rows > self.max_result_rows)
+        with self._lock:
+            self.estimates += 1
+            self.heavy += int(heavy)
+        return {
+            "plan": plan,
+            "rows_scanned": rows_scanned,
+            "result_rows": result_rows,
+            "uses_index": uses_index,
+            "full_scans": full_scans,
+            "heavy": heavy,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "estimates": self.estimates,
+                "heavy": self.heavy,
+                "failures": self.failures,
+                "max_result_rows": self.max_result_rows,
+                "max_scan_rows": self.max_scan_rows,
+            }
+
+
+# Globalna instancja
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_query_cost_estimator():
+    """
+    Pobierz globalny estymator kosztu albo None, gdy agents.evaluator_agent.plan_based
+    jest wyłączone lub baza transakcji nie istnieje (wtedy ewaluator zgaduje YES/NO z pytania).
+    """
+    global _estimator
+    config = get_ai_config()
+    if not config.get("agents", "evaluator_agent", "plan_based", default=True):
+        return None
+    with _estimator_lock:
+        if _estimator is None:
+            db_path = resolve_transactions_db_path()
+            if not db_path or not os.path.exists(db_path):
+                logger.warning(f"Plan-based evaluation unavailable, database file not found: {db_path}")
+                return None
+            _estimator = QueryCostEstimator(
+                db_path,
+                max_result_rows=config.get("agents", "evaluator_agent", "max_result_rows", default=200),
+                max_scan_rows=config.get("agents", "evaluator_agent", "max_scan_rows", default=1000000),
+            )
+        return _estimator
+
+
+def query_cost_stats():
+    return _estimator.stats() if _estimator is not None else None
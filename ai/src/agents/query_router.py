@@ -0,0 +1,240 @@
+import os
+import sys
+import re
+import json
+import math
+import threading
+from collections import Counter, deque
+from pathlib import Path
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# Reguły (wzorzec, waga): dodatnie wagi -> ciężkie zapytanie (RAG), ujemne -> lekkie (agent SQL)
+ROUTING_RULES = [
+    # Analiza całej historii / opisowe podsumowania - RAG
+    (r"\b(all|every|entire|whole)\b.*\b(transactions?|history|spending|expenses)\b", 2.0),
+    (r"\b(wszystki\w*|ca[łl][aąy]\w*|pe[łl]n[aąy]\w*)\b.*\b(transakcj\w*|histori\w*|wydatk\w*)\b", 2.0),
+    (r"\b(summar\w*|overview|analy[sz]\w*|insights?|patterns?|trends?|habits?|behaviou?r)\b", 2.0),
+    (r"\b(podsum\w*|przegl[aą]d\w*|analiz\w*|przeanalizuj|wzorc\w*|trend\w*|nawyk\w*|zachowa\w*)\b", 2.0),
+    (r"\b(categori[sz]e|group|classify|kategoryzuj|pogrupuj|sklasyfikuj)\b", 1.5),
+    (r"\b(unusual|anomal\w*|suspicious|nietypow\w*|podejrzan\w*|anomali\w*)\b", 1.5),
+    (r"\b(recommend\w*|advice|advise|save money|porad\w*|rekomend\w*|oszcz[eę]dz\w*)\b", 1.5),
+    (r"\b(dump|export|eksport\w*)\b", 1.5),
+    # Konkretne, zawężone pytania - agent SQL
+    (r"\b(last|latest|recent|ostatni\w*)\s+\d+\b", -2.5),
+    (r"\b(top|first|pierwsz\w*|najwi[eę]ksz\w*|najmniejsz\w*|largest|smallest|biggest)\s*\d*\b", -1.5),
+    (r"\b(how much|how many|total|sum|count|average|ile|suma\w*|[łl][aą]czn\w*|[śs]redni\w*|policz)\b", -2.0),
+    (r"\b(balance|saldo|stan konta)\b", -2.5),
+    (r"\b\d{4}-\d{2}-\d{2}\b", -1.0),
+    (r"\b(today|yesterday|dzi[śs]|wczoraj)\b", -1.5),
+    (r"\b(last|latest|ostatni\w*)\s+(transaction|transakcj\w*|payment|p[łl]atno[śs]\w*)\b", -1.5),
+    (r"\b(blik|iban)\b", -0.5),
+]
+
+
+class NaiveBayesRouter:
+    """Lekki, lokalny klasyfikator YES/NO (multinomial Naive Bayes) uczony z zalogowanych decyzji."""
+
+    def __init__(self):
+        self.class_counts = Counter()
+        self.token_counts = {"YES": Counter(), "NO": Counter()}
+        self.vocabulary = set()
+
+    @staticmethod
+    def tokenize(text):
+        return WORD.findall(text.lower())
+
+    def fit(self, samples):
+        self.class_counts = Counter()
+        self.token_counts = {"YES": Counter(), "NO": Counter()}
+        self.vocabulary = set()
+        for question, verdict in samples:
+            tokens = self.tokenize(question)
+            self.class_counts[verdict] += 1
+            self.token_counts[verdict].update(tokens)
+            self.vocabulary.update(tokens)
+        return self
+
+    def predict(self, question):
+        """Zwróć (werdykt, prawdopodobieństwo) albo (None, 0.0), gdy model nie jest wytrenowany."""
+        total = sum(self.class_counts.values())
+        if not total or len(self.class_counts) < 2:
+            return None, 0.0
+
+        tokens = self.tokenize(question)
+        vocabulary_size = len(self.vocabulary) or 1
+        log_probs = {}
+        for verdict in ("YES", "NO"):
+            log_prob = math.log(self.class_counts[verdict] / total)
+            token_total = sum(self.token_counts[verdict].values())
+            for token in tokens:
+                log_prob += math.log((self.token_counts[verdict][token] + 1) / (token_total + vocabulary_size))
+            log_probs[verdict] = log_prob
+
+        best = max(log_probs, key=log_probs.get)
+        max_log = log_probs[best]
+        normalizer = sum(math.exp(value - max_log) for value in log_probs.values())
+        return best, 1.0 / normalizer
+
+
+class QueryRouter:
+    """
+    Router bez LLM przed SQLQueryEvaluatorAgent.
+
+    Oczywiste przypadki rozstrzygają reguły słów kluczowych i wzorców, potem
+    (opcjonalnie) lokalny klasyfikator uczony z decyzji LLM. LLM jest pytany
+    tylko wtedy, gdy pewność jest zbyt niska.
+    """
+
+    def __init__(self, min_confidence=0.6, classifier_enabled=True, decision_log=None,
+                 min_training_samples=30, retrain_every=20, max_samples=2000):
+        self.min_confidence = min_confidence
+        self.classifier_enabled = classifier_enabled
+        self.decision_log = Path(decision_log) if decision_log else None
+        self.min_training_samples = min_training_samples
+        self.retrain_every = retrain_every
+        self.max_samples = max_samples
+        self.rules = [(re.compile(pattern), weight) for pattern, weight in ROUTING_RULES]
+        self.classifier = NaiveBayesRouter()
+        self.counters = Counter()
+        # Okno ostatnich decyzji - klasyfikator uczy się tylko na nim, a log jest do niego przycinany
+        self._samples = deque(maxlen=max_samples)
+        self._new_samples = 0
+        self._logged_samples = 0
+        self._lock = threading.Lock()
+
+        if self.classifier_enabled:
+            self._load_samples()
+
+    def _load_samples(self):
+        if not self.decision_log or not self.decision_log.exists():
+            return
+        try:
+            with open(self.decision_log, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._samples.append((record["question"], record["verdict"]))
+                    self._logged_samples += 1
+            self._compact_log()
+            self._train()
+            logger.info(f"Query router loaded {len(self._samples)} logged routing decisions")
+        except Exception as e:
+            logger.warning(f"Cannot load routing decision log {self.decision_log}: {str(e)}")
+
+    def _train(self):
+        if len(self._samples) >= self.min_training_samples:
+            self.classifier.fit(self._samples)
+        self._new_samples = 0
+
+    def _compact_log(self):
+        """Przytnij log decyzji do okna max_samples (zapis do pliku tymczasowego i podmiana)."""
+        if not self.decision_log or self._logged_samples <= self.max_samples:
+            return
+        temp_path = self.decision_log.with_name(self.decision_log.name + ".tmp")
+        try:
+            with open(temp_path, "w") as f:
+                for question, verdict in self._samples:
+                    f.write(json.dumps({"question": question, "verdict": verdict}, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.decision_log)
+            self._logged_samples = len(self._samples)
+        except Exception as e:
+            logger.warning(f"Cannot compact routing decision log {self.decision_log}: {str(e)}")
+
+    def rule_score(self, question):
+        text = question.lower()
+        return sum(weight for pattern, weight in self.rules if pattern.search(text))
+
+    def route(self, question):
+        """
+        Zwróć (werdykt, pewność, źródło) albo (None, pewność, None), gdy trzeba zapytać LLM.
+        """
+        with self._lock:
+            self.counters["total"] += 1
+
+        score = self.rule_score(question)
+        # Wynik reguł zamieniony na pewność z przedziału 0.5-1.0
+        rule_confidence = 1.0 / (1.0 + math.exp(-abs(score)))
+        if score != 0 and rule_confidence >= self.min_confidence:
+            verdict = "YES" if score > 0 else "NO"
+            with self._lock:
+                self.counters["rules"] += 1
+            return verdict, rule_confidence, "rules"
+
+        if self.classifier_enabled:
+            with self._lock:
+                verdict, probability = self.classifier.predict(question)
+            if verdict is not None and probability >= self.min_confidence:
+                with self._lock:
+                    self.counters["classifier"] += 1
+                return verdict, probability, "classifier"
+
+        with self._lock:
+            self.counters["llm"] += 1
+        return None, rule_confidence if score else 0.0, None
+
+    def record(self, question, verdict):
+        """Zapisz decyzję LLM - dane treningowe dla lokalnego klasyfikatora."""
+        if not self.classifier_enabled or verdict not in ("YES", "NO"):
+            return
+        with self._lock:
+            self._samples.append((question, verdict))
+            self._new_samples += 1
+            if self.decision_log:
+                try:
+                    self.decision_log.parent.mkdir(parents=True, exist_ok=True)
+                    with open(self.decision_log, "a") as f:
+                        f.write(json.dumps({"question": question, "verdict": verdict}, ensure_ascii=False) + "\n")
+                    self._logged_samples += 1
+                except Exception as e:
+                    logger.warning(f"Cannot write routing decision log: {str(e)}")
+            if self._new_samples >= self.retrain_every:
+                # Log rośnie najwyżej o retrain_every wpisów ponad okno, zanim zostanie przycięty
+                self._compact_log()
+                self._train()
+
+    def stats(self):
+        with self._lock:
+            total = self.counters["total"]
+            without_llm = self.counters["rules"] + self.counters["classifier"]
+            return {
+                "total": total,
+                "rules": self.counters["rules"],
+                "classifier": self.counters["classifier"],
+                "llm": self.counters["llm"],
+                "without_llm_ratio": round(without_llm / total, 4) if total else 0.0,
+                "training_samples": len(self._samples),
+            }
+
+
+# Globalny instance
+_query_router = None
+_query_router_lock = threading.Lock()
+
+
+def get_query_router():
+    """Pobierz współdzielony router zapytań (None, gdy wyłączony w konfiguracji)."""
+    global _query_router
+    config = get_ai_config()
+    if not config.get("agents", "evaluator_agent", "router_enabled", default=True):
+        return None
+    with _query_router_lock:
+        if _query_router is None:
+            decision_log = config.get("agents", "evaluator_agent", "decision_log", default=None) \
+                or Path(ai_root) / "data" / "router_decisions.jsonl"
+            _query_router = QueryRouter(
+                min_confidence=config.get("agents", "evaluator_agent", "router_min_confidence", default=0.8),
+                classifier_enabled=config.get("agents", "evaluator_agent", "router_classifier", default=True),
+                decision_log=decision_log,
+                max_samples=config.get("agents", "evaluator_agent", "router_max_samples", default=2000),
+            )
+        return _query_router
@@ -0,0 +1,108 @@
+import os
+import sys
+import re
+import time
+from typing import Any, Optional
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from langchain_community.tools import QuerySQLDatabaseTool
+from src.utils.ttl_cache import TTLCache
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+# Literały w apostrofach/cudzysłowach zostają nietknięte, reszta jest kanonizowana
+SQL_TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[^'\"]+")
+SQL_COMMENT_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+READ_ONLY_PATTERN = re.compile(r"^\s*(SELECT|WITH|EXPLAIN)\b", re.IGNORECASE)
+
+# Wyniki zapytań współdzielone przez wszystkie sesje: (SQL kanoniczny, wersja bazy) -> wynik
+_config = get_ai_config()
+_results = TTLCache(
+    max_size=_config.get("database", "query_cache_size", default=500),
+    ttl=_config.get("database", "query_cache_ttl", default=600),
+)
+
+
+def canonicalize_sql(query):
+    """
+    Postać kanoniczna zapytania: bez bloków ```sql, komentarzy, średników na końcu,
+    z pojedynczymi spacjami i wielkimi literami poza literałami tekstowymi.
+    """
+    text = (query or "").strip()
+    if text.startswith("`"):
+        text = text.strip("`")
+        if text[:3].lower() == "sql":
+            text = text[3:]
+    parts = []
+    for token in SQL_TOKEN_PATTERN.findall(text):
+        if token[0] in "'\"":
+            parts.append(token)
+        else:
+            token = SQL_COMMENT_PATTERN.sub(" ", token)
+            parts.append(WHITESPACE_PATTERN.sub(" ", token).upper())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def db_version_stamp(db_path):
+    """Znacznik wersji bazy: mtime i rozmiar pliku oraz dziennika WAL (zmiana = nowa wersja)."""
+    stamp = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def sql_cache_stats():
+    return _results.stats()
+
+
+class CachedQuerySQLDatabaseTool(QuerySQLDatabaseTool):
+    """
+    QuerySQLDatabaseTool z cache wyników zapytań tylko do odczytu.
+
+    Kluczem jest kanoniczny tekst SQL i znacznik wersji pliku bazy (oraz dołączonego
+    pliku agregatów), więc powtórzone zapytanie (w tym samym przebiegu ReAct albo
+    w innej sesji) wraca z pamięci, a każda zmiana bazy unieważnia stare wpisy.
+    """
+
+    db_path: Optional[str] = None
+    aggregates_path: Optional[str] = None
+    max_result_chars: int = 100000
+    query_log: Optional[Any] = None  # SQLQueryLog - każde wykonanie trafia do dziennika zapytań
+
+    def _log(self, canonical, start, result, cached=False):
+        if self.query_log is not None:
+            error = result if isinstance(result, str) and result.startswith("Error:") else None
+            self.query_log.record(canonical, (time.perf_counter() - start) * 1000, cached=cached, error=error)
+
+    def _run(self, query, run_manager=None):
+        start = time.perf_counter()
+        canonical = canonicalize_sql(query)
+        if not self.db_path or not READ_ONLY_PATTERN.match(canonical):
+            result = super()._run(query, run_manager=run_manager)
+            self._log(canonical, start, result)
+            return result
+
+        key = (canonical, db_version_stamp(self.db_path),
+               db_version_stamp(self.aggregates_path) if self.aggregates_path else None)
+        cached = _results.get(key)
+        if cached is not None:
+            logger.info(f"SQL result served from cache: {key[0][:80]}")
+            self._log(canonical, start, cached, cached=True)
+            return cached
+
+        result = super()._run(query, run_manager=run_manager)
+        self._log(canonical, start, result)
+        if isinstance(result, str) and not result.startswith("Error:") and len(result) <= self.max_result_chars:
+            _results.set(key, result)
+        return result
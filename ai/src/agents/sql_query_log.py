@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import threading
+import re
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from src.agents.transactions_db import connect_readonly, available_aggregates_path, resolve_transactions_db_path
+from src.utils.ttl_cache import TTLCache
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+
+def query_log_path_for(db_path):
+    """Plik dziennika zapytań: database.query_log_path albo <baza>_query_log.db obok bazy."""
+    configured = get_ai_config().get("database", "query_log_path", default=None)
+    if configured:
+        return os.path.abspath(configured)
+    root, _ = os.path.splitext(os.path.abspath(db_path))
+    return f"{root}_query_log.db"
+
+
+def explain_query_plan(conn, sql):
+    """Szczegóły EXPLAIN QUERY PLAN jako lista napisów (np. 'SCAN all_transactions')."""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def resolve_table_alias(sql, name):
+    """Nazwa tabeli dla nazwy z kroku planu (plan podaje alias, jeśli zapytanie go używa)."""
+    aliased = re.search(rf"\b(?:FROM|JOIN)\s+([\w.]+)\s+(?:AS\s+)?{re.escape(name)}\b", sql, re.IGNORECASE)
+    return aliased.group(1).split(".")[-1] if aliased else name
+
+
+def is_full_scan(plan):
+    """Czy plan zawiera pełny skan tabeli (SCAN bez indeksu)."""
+    return any(step.startswith("SCAN ") and " INDEX " not in step for step in plan)
+
+
+class SQLQueryLog:
+    """
+    Dziennik zapytań wykonanych przez agenta SQL (osobny plik SQLite).
+
+    Wpis to kanoniczny SQL, czas wykonania, plan z EXPLAIN QUERY PLAN oraz flagi
+    pełnego skanu i trafienia w cache. Narzędzie agenta tylko wrzuca wpis do
+    kolejki - plan liczy i zapisuje wątek w tle, więc ścieżka zapytania nie czeka.
+    Na podstawie dziennika index_advisor proponuje indeksy.
+    """
+
+    def __init__(self, path, db_path, max_rows=100000):
+        self.path = str(path)
+        self.db_path = os.path.abspath(db_path)
+        self.max_rows = max(1, int(max_rows))
+        self.recorded = 0
+        self.dropped = 0
+        self._plans = TTLCache(max_size=1000, ttl=300)
+        self._queue = queue.Queue(maxsize=10000)
+        self._writer = None
+        self._lock = threading.Lock()
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_log ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "executed_at REAL NOT NULL, "
+                    "sql TEXT NOT NULL, "
+                    "duration_ms REAL NOT NULL, "
+                    "plan TEXT, "
+                    "full_scan INTEGER NOT NULL DEFAULT 0, "
+                    "cached INTEGER NOT NULL DEFAULT 0, "
+                    "error TEXT)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_query_log_sql ON query_log (sql)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, sql, duration_ms, cached=False, error=None):
+        """Zakolejkuj wpis (nie blokuje - przy pełnej kolejce wpis jest pomijany)."""
+        self._start_writer()
+        try:
+            self._queue.put_nowait((time.time(), sql, float(duration_ms), bool(cached), error))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="sql-query-log", daemon=True)
+                self._writer.start()
+
+    def _plan(self, sql):
+        plan = self._plans.get(sql)
+        if plan is None:
+            conn = connect_readonly(self.db_path, aggregates_path=available_aggregates_path(self.db_path))
+            try:
+                plan = explain_query_plan(conn, sql)
+            except sqlite3.Error:
+                plan = []
+            finally:
+                conn.close()
+            self._plans.set(sql, plan)
+        return plan
+
+    def _run_writer(self):
+        conn = self._connect()
+        while True:
+            entries = [self._queue.get()]
+            while not self._queue.empty() and len(entries) < 100:
+                entries.append(self._queue.get_nowait())
+            try:
+                rows = []
+                for executed_at, sql, duration_ms, cached, error in entries:
+                    plan = [] if error else self._plan(sql)
+                    rows.append((executed_at, sql, duration_ms, json.dumps(plan),
+                                 int(is_full_scan(plan)), int(cached), error))
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO query_log (executed_at, sql, duration_ms, plan, full_scan, cached, error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    conn.execute(
+                        "DELETE FROM query_log WHERE id <= (SELECT MAX(id) FROM query_log) - ?", (self.max_rows,)
+                    )
+                self.recorded += len(rows)
+            except Exception as e:
+                logger.error(f"SQL query log write failed: {str(e)}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def flush(self, timeout=5):
+        """Poczekaj, aż zakolejkowane wpisy zostaną zapisane."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+        }
+
+
+# Globalne instancje (jedna na plik bazy)
+_query_logs = {}
+_query_logs_lock = threading.Lock()
+
+
+def get_query_log(db_path=None):
+    """Pobierz dziennik zapytań dla bazy albo None, gdy database.query_log jest wyłączony."""
+    config = get_ai_config()
+    if not config.get("database", "query_log", default=True):
+        return None
+    db_path = os.path.abspath(db_path or resolve_transactions_db_path())
+    with _query_logs_lock:
+        query_log = _query_logs.get(db_path)
+        if query_log is None:
+            query_log = SQLQueryLog(
+                query_log_path_for(db_path),
+                db_path,
+                max_rows=config.get("database", "query_log_max_rows", default=100000),
+            )
+            _query_logs[db_path] = query_log
+        return query_log
+
+
+def query_log_stats():
+    with _query_logs_lock:
+        logs = list(_query_logs.values())
+    if not logs:
+        return None
+    return logs[0].stats() if len(logs) == 1 else {log.db_path: log.stats() for log in logs}
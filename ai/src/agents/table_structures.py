@@ -18,4 +18,14 @@ ALL_TRANSACTIONS_TABLE_STRUCTURE = """
 17. balance_after_currency - TEXT - balance currency
 18. balance_after_type - TEXT - balance type (e.g., 'interimBooked')
 19. raw_data - TEXT - full transaction data as JSON
-"""
\ No newline at end of file
+"""
+AGGREGATE_TABLES_STRUCTURE = """
+Precomputed summary tables (refreshed from `all_transactions`):
+`daily_totals` (day - TEXT 'YYYY-MM-DD') and `monthly_totals` (month - TEXT 'YYYY-MM'), both with columns:
+- account_id - TEXT - account identifier
+- currency - TEXT - currency
+- counterparty - TEXT - creditor_name for expenses, debtor_name for income ('(unknown)' if missing)
+- direction - TEXT - 'expense' (amount < 0) or 'income' (amount >= 0)
+- total - REAL - sum of amounts (expenses are negative)
+- tx_count - INTEGER - number of transactions
+"""
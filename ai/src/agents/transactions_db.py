@@ -0,0 +1,156 @@
+import os
+import sys
+import zlib
+import sqlite3
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from langchain_community.utilities import SQLDatabase
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+# Pragmy dla połączeń tylko do odczytu: mmap + duży cache stron, tabele tymczasowe w pamięci
+READONLY_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+# Schemat, pod którym plik agregatów jest dołączany do połączeń agenta
+AGGREGATES_SCHEMA = "agg"
+
+
+def resolve_transactions_db_path():
+    """Pobierz ścieżkę do bazy transakcji ze zmiennych środowiskowych lub konfiguracji."""
+    db_path = os.environ.get("transactions_db_path")
+    if not db_path:
+        db_path = get_ai_config().get("database", "path")
+    return db_path
+
+
+def aggregates_path_for(db_path):
+    """Plik zmaterializowanych agregatów: database.aggregates_path albo <baza>_aggregates.db obok bazy."""
+    configured = get_ai_config().get("database", "aggregates_path", default=None)
+    if configured:
+        return os.path.abspath(configured)
+    root, _ = os.path.splitext(os.path.abspath(db_path))
+    return f"{root}_aggregates.db"
+
+
+def available_aggregates_path(db_path):
+    """Plik agregatów do dołączenia albo None (wyłączone w database.aggregates lub jeszcze niezbudowane)."""
+    if not get_ai_config().get("database", "aggregates", default=True):
+        return None
+    path = aggregates_path_for(db_path)
+    return path if os.path.exists(path) else None
+
+
+def db_path_from_uri(db_uri):
+    """Wyciągnij ścieżkę pliku z URI SQLAlchemy (sqlite:///...)."""
+    return make_url(db_uri).database
+
+
+def row_checksum(*values):
+    """Deterministyczna suma kontrolna wartości wiersza (CRC32) - wykrywa edycje bez porównywania treści."""
+    return zlib.crc32(repr(values).encode("utf-8"))
+
+
+def register_row_checksum(conn):
+    """Udostępnij row_checksum(kolumna, ...) w zapytaniach SQL na połączeniu."""
+    conn.create_function("row_checksum", -1, row_checksum, deterministic=True)
+    return conn
+
+
+def connect_readonly(db_path, timeout=30, check_same_thread=True, aggregates_path=None):
+    """
+    Otwórz połączenie SQLite w trybie mode=ro ze strojonymi pragmami. Podany plik
+    agregatów jest dołączany jako schemat agg (tabele widoczne też bez prefiksu).
+    """
+    conn = sqlite3.connect(
+        f"file:{os.path.abspath(db_path)}?mode=ro",
+        uri=True,
+        timeout=timeout,
+        check_same_thread=check_same_thread,
+    )
+    if aggregates_path:
+        conn.execute(f"ATTACH DATABASE ? AS {AGGREGATES_SCHEMA}", (f"file:{aggregates_path}?mode=ro",))
+    for pragma in READONLY_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """SQLDatabase z zapamiętanym opisem tabel - schemat jest odbijany i opisywany raz na proces."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._table_info_cache = {}
+        self._table_info_lock = threading.Lock()
+
+    def get_table_info(self, table_names=None):
+        key = tuple(sorted(table_names)) if table_names else None
+        with self._table_info_lock:
+            if key not in self._table_info_cache:
+                self._table_info_cache[key] = super().get_table_info(table_names)
+            return self._table_info_cache[key]
+
+
+def create_readonly_engine(db_path, aggregates_path=None):
+    config = get_ai_config()
+    pool_size = int(config.get("database", "max_connections", default=10))
+    timeout = config.get("database", "connection_timeout", default=30)
+
+    engine = create_engine(
+        "sqlite://",
+        creator=lambda: connect_readonly(db_path, timeout=timeout, check_same_thread=False,
+                                         aggregates_path=aggregates_path),
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=timeout,
+    )
+    return engine
+
+
+# Globalne instancje (jedna na plik bazy)
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_transactions_db(db_uri=None):
+    """
+    Pobierz współdzielony SQLDatabase nad pulą połączeń tylko do odczytu.
+
+    Silnik i odbity schemat są tworzone raz na proces, a rozmiar puli pochodzi
+    z database.max_connections w ai_config.json. Gdy plik agregatów już istnieje,
+    połączenia dostają go dołączonego - jego pojawienie się tworzy nowy silnik.
+    """
+    db_uri = db_uri or os.getenv("transactions_db_uri")
+    if not db_uri:
+        raise ValueError("Database URI is required")
+    db_path = os.path.abspath(db_path_from_uri(db_uri))
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+
+    aggregates_path = available_aggregates_path(db_path)
+
+    with _databases_lock:
+        db = _databases.get((db_path, aggregates_path))
+        if db is None:
+            engine = create_readonly_engine(db_path, aggregates_path)
+            db = CachedSQLDatabase(engine, include_tables=["all_transactions"])
+            _databases[(db_path, aggregates_path)] = db
+            logger.info(f"Shared read-only transactions database opened: {db_path} "
+                        f"(pool size {engine.pool.size()}, aggregates: {bool(aggregates_path)})")
+        return db
@@ -1,5 +1,7 @@
 import os
 import sys
+import asyncio
+import threading
 
 # Użyj lokalnego systemu AI
 ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -7,14 +9,16 @@ if ai_root not in sys.path:
     sys.path.insert(0, ai_root)
 
 from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableLambda
 from typing_extensions import TypedDict
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from src.agents.SQL_Agent import SQL_Agent
+from src.agents.SQL_Agent import SQL_Agent, AGENT_ERROR_RESPONSE
 from src.agents.SQLQueryEvaluatorAgent import SQLQueryEvaluatorAgent
-from src.rags.advanced_rag_config import AdaptiveRAG
-import sqlite3
+from src.agents.query_router import get_query_router
+from src.rags.advanced_rag_config import AdaptiveRAG, FUSED_ANSWER_TAG, FUSED_ANSWER_MARKER
+from src.rags.basic_rag import FINAL_ANSWER_TAG
+from src.rags.index_store import get_index_store
+from src.rags.answer_cache import get_answer_cache
+from src.utils.single_flight import SingleFlight
 from config.logging import get_logger
 from config.config_manager import get_ai_config
 
@@ -30,29 +34,225 @@ class State(TypedDict):
     agent_response: str | None
     rag_response: str | None
     is_sql_query_heavy: str | None
+    messages: list
+    rag_index: str | None
+    cached_answer: bool | None
+
+# Pola stanu zapisywane w magazynie sesji; agenci i RAG są odtwarzani z cache procesu
+SERIALIZABLE_FIELDS = (
+    "graph_state",
+    "user_message",
+    "agent_response",
+    "rag_response",
+    "is_sql_query_heavy",
+    "messages",
+    "rag_index",
+)
+
+# Agent ReAct: odpowiedź końcowa zaczyna się po tym znaczniku, wcześniej są kroki Thought/Action
+REACT_FINAL_ANSWER = "Final Answer:"
+
+# Współdzielone instancje AdaptiveRAG: (klient LLM, wektorowy indeks) -> AdaptiveRAG
+_rags = {}
+_rags_lock = threading.Lock()
+_rags_flight = SingleFlight()
+
+
+def initial_state():
+    return {
+        "graph_state": "START",
+        "rag": None,
+        "sql_agent": None,
+        "evaluate_sql_statement_agent": None,
+        "user_message": None,
+        "agent_response": None,
+        "rag_response": None,
+        "is_sql_query_heavy": None,
+        "messages": [],
+        "rag_index": None,
+        "cached_answer": False,
+    }
+
+
+def get_shared_rag(llm, vectorstore=None):
+    """
+    AdaptiveRAG nad współdzielonym indeksem transakcji, jeden na klienta LLM i wersję indeksu.
+    Bez podanego vectorstore indeks jest najpierw doprowadzany do zgodności z bazą.
+    """
+    index_store = get_index_store()
+    if vectorstore is None:
+        vectorstore = index_store.get_vectorstore()
+    key = (id(llm), id(vectorstore))
+    with _rags_lock:
+        rag = _rags.get(key)
+    if rag is not None:
+        return rag
+
+    def create():
+        retriever = index_store.as_retriever(vectorstore=vectorstore)
+        if retriever is None:
+            return None
+        rag = AdaptiveRAG(llm, retriever, vectorstore)
+        with _rags_lock:
+            # Starsze wersje indeksu nie są już potrzebne; RAG innych klientów LLM nad tym samym
+            # indeksem zostają, żeby kilka aktywnych klientów nie wypierało się nawzajem
+            for stale_key in [cached_key for cached_key in _rags if cached_key[1] != key[1]]:
+                del _rags[stale_key]
+            _rags[key] = rag
+        return rag
+
+    return _rags_flight.do(key, create)
+
+
+def _attached_rag():
+    """
+    RAG dla odtwarzanej sesji bez odświeżania indeksu na ścieżce żądania - świeżość
+    zapewnia harmonogram (rag.refresh_interval) i /rag/refresh. Indeks w pamięci,
+    a bez niego wczytany z dysku; RAG jest brany z cache pod kluczem (klient LLM, indeks),
+    więc po zmianie providera lub modelu sesja nie dostaje RAG ze starym klientem.
+    """
+    index_store = get_index_store()
+    vectorstore = index_store.vectorstore or index_store.load()
+    if vectorstore is None:
+        return None, None
+    # Klient LLM pochodzi ze współdzielonej puli - utworzenie agenta nie otwiera nowych połączeń
+    evaluator = SQLQueryEvaluatorAgent()
+    return get_shared_rag(evaluator.llm, vectorstore), evaluator
+
+
+def snapshot_state(state):
+    """Serializowalna (JSON) część stanu do zapisu w magazynie sesji."""
+    return {field: state.get(field) for field in SERIALIZABLE_FIELDS}
+
+
+def restore_state(snapshot):
+    """
+    Odtwórz stan grafu z zapisu sesji. Ciężkie obiekty nie są zapisywane -
+    RAG jest podpinany ze współdzielonego indeksu, a agenci tworzeni leniwie
+    przez węzły, więc dowolny worker może obsłużyć dowolną sesję.
+    """
+    state = initial_state()
+    if not snapshot:
+        return state
+    state.update({field: snapshot.get(field) for field in SERIALIZABLE_FIELDS if field in snapshot})
+    state["messages"] = list(state.get("messages") or [])
+    if state.get("rag_index"):
+        try:
+            state["rag"], state["evaluate_sql_statement_agent"] = _attached_rag()
+        except Exception as e:
+            logger.error(f"Failed to reattach RAG to session: {str(e)}")
+            state["rag"] = None
+        if state["rag"] is None:
+            state["rag_index"] = None
+    return state
+
+
+def _with_history(state, answer):
+    """Historia wiadomości sesji przycięta do session.max_messages."""
+    max_messages = get_ai_config().get("session", "max_messages", default=20)
+    messages = list(state.get("messages") or [])
+    messages.append({"role": "user", "content": state.get("user_message")})
+    messages.append({"role": "assistant", "content": answer})
+    return messages[-max_messages:] if max_messages else messages
+
+def _answer_cache_context(question):
+    """Cache odpowiedzi z aktualną wersją danych i ograniczeniami pytania (albo None)."""
+    cache = get_answer_cache()
+    if cache is None:
+        return None
+    index_store = get_index_store()
+    return cache, index_store.data_version(), index_store.question_constraints(question)
+
+def _remember_answer(question, route, answer):
+    try:
+        context = _answer_cache_context(question)
+        if context is not None:
+            cache, data_version, constraints = context
+            cache.store(question, route, answer, data_version, constraints)
+    except Exception as e:
+        logger.warning(f"Answer not cached: {str(e)}")
+
+def _cached_answer(question, route):
+    """
+    Odpowiedź z cache dla trasy wybranej przez router albo None. Sprawdzana dopiero
+    w węźle odpowiedzi, tuż przed wywołaniem LLM - routing nie płaci za embedding pytania.
+    """
+    try:
+        context = _answer_cache_context(question)
+        cached = context[0].lookup(question, context[1], context[2], route=route) if context else None
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed: {str(e)}")
+        return None
+    return cached[0] if cached is not None else None
+
+def _cached_result(state, field, answer):
+    return {
+        "user_message": state.get("user_message"),
+        field: answer,
+        "messages": _with_history(state, answer),
+        "cached_answer": True,
+    }
 
 def node_1(state):
     logger.info("Executing Node 1 - checking RAG existence")
+    state["cached_answer"] = False
     if state.get("rag") is not None:
         logger.info("RAG exists, proceeding to rag_node")
     else:
         logger.info("RAG does not exist, proceeding to evaluate_sql_statement")
     return state
 
+async def anode_1(state):
+    return node_1(state)
+
+def _route_locally(user_message):
+    # Oczywiste przypadki rozstrzyga lokalny router - bez wywołania LLM. Estymator kosztu planu
+    # potrzebuje szkicu SQL od LLM, więc działa tylko dla pytań, których router nie rozstrzygnął
+    router = get_query_router()
+    response, confidence, source = router.route(user_message) if router else (None, 0.0, None)
+    if response is not None:
+        logger.info(f"Query routed by {source} without LLM (confidence {confidence:.2f})")
+    return router, response
+
+def _apply_verdict(state, response):
+    if response == "YES":
+        logger.info("Query is heavy - will create RAG")
+        state["is_sql_query_heavy"] = "YES"
+    else:
+        logger.info("Query is light - will use agent")
+        state["is_sql_query_heavy"] = "NO"
+    return state
+
 def evaluate_sql_statement(state):
     logger.info("Evaluating SQL query complexity")
     try:
-        if state.get("evaluate_sql_statement_agent") is None:
-            state["evaluate_sql_statement_agent"] = SQLQueryEvaluatorAgent()
         user_message = state.get("user_message")
-        response = state["evaluate_sql_statement_agent"].is_query_heavy(user_message)
-        if response == "YES":
-            logger.info("Query is heavy - will create RAG")
-            state["is_sql_query_heavy"] = "YES"
-        else:
-            logger.info("Query is light - will use agent")
-            state["is_sql_query_heavy"] = "NO"
+        router, response = _route_locally(user_message)
+        if response is None:
+            if state.get("evaluate_sql_statement_agent") is None:
+                state["evaluate_sql_statement_agent"] = SQLQueryEvaluatorAgent()
+            response = state["evaluate_sql_statement_agent"].is_query_heavy(user_message)
+            if router:
+                router.record(user_message, response)
+        return _apply_verdict(state, response)
+    except Exception as e:
+        logger.error(f"Error evaluating SQL statement: {str(e)}")
+        state["is_sql_query_heavy"] = "NO"  # Fallback to agent
         return state
+
+async def aevaluate_sql_statement(state):
+    logger.info("Evaluating SQL query complexity")
+    try:
+        user_message = state.get("user_message")
+        router, response = _route_locally(user_message)
+        if response is None:
+            if state.get("evaluate_sql_statement_agent") is None:
+                state["evaluate_sql_statement_agent"] = SQLQueryEvaluatorAgent()
+            response = await state["evaluate_sql_statement_agent"].ais_query_heavy(user_message)
+            if router:
+                # Zapis do logu decyzji (i ewentualny retrening) blokuje - poza pętlą zdarzeń
+                await asyncio.to_thread(router.record, user_message, response)
+        return _apply_verdict(state, response)
     except Exception as e:
         logger.error(f"Error evaluating SQL statement: {str(e)}")
         state["is_sql_query_heavy"] = "NO"  # Fallback to agent
@@ -62,11 +262,39 @@ def rag_node(state):
     logger.info("Processing with RAG")
     try:
         user_message = state.get("user_message")
+        cached = _cached_answer(user_message, "rag")
+        if cached is not None:
+            return _cached_result(state, "rag_response", cached)
         rag_response = state["rag"].query(user_message)
         logger.info("RAG response generated successfully")
+        _remember_answer(user_message, "rag", rag_response["answer"])
+        return {
+            "user_message": user_message,
+            "rag_response": rag_response["answer"],
+            "messages": _with_history(state, rag_response["answer"]),
+        }
+    except Exception as e:
+        logger.error(f"Error in RAG node: {str(e)}")
+        return {
+            "user_message": state.get("user_message"),
+            "rag_response": "Sorry, I encountered an error processing your request with the knowledge base."
+        }
+
+async def arag_node(state):
+    logger.info("Processing with RAG")
+    try:
+        user_message = state.get("user_message")
+        # Embedding pytania i odcisk danych mogą wymagać I/O - poza pętlą zdarzeń
+        cached = await asyncio.to_thread(_cached_answer, user_message, "rag")
+        if cached is not None:
+            return _cached_result(state, "rag_response", cached)
+        rag_response = await state["rag"].aquery(user_message)
+        logger.info("RAG response generated successfully")
+        await asyncio.to_thread(_remember_answer, user_message, "rag", rag_response["answer"])
         return {
             "user_message": user_message,
-            "rag_response": rag_response["answer"]
+            "rag_response": rag_response["answer"],
+            "messages": _with_history(state, rag_response["answer"]),
         }
     except Exception as e:
         logger.error(f"Error in RAG node: {str(e)}")
@@ -78,14 +306,45 @@ def rag_node(state):
 def agent_node(state):
     logger.info("Processing with SQL Agent")
     try:
+        user_message = state.get("user_message")
+        cached = _cached_answer(user_message, "agent")
+        if cached is not None:
+            return _cached_result(state, "agent_response", cached)
         if state.get("sql_agent") is None:
             state["sql_agent"] = SQL_Agent()
-        user_message = state.get("user_message")
         agent_response = state["sql_agent"].get_agent_response(user_message)
         logger.info("Agent response generated successfully")
+        if agent_response != AGENT_ERROR_RESPONSE:
+            _remember_answer(user_message, "agent", agent_response)
+        return {
+            "user_message": user_message,
+            "agent_response": agent_response,
+            "messages": _with_history(state, agent_response),
+        }
+    except Exception as e:
+        logger.error(f"Error in agent node: {str(e)}")
+        return {
+            "user_message": state.get("user_message"),
+            "agent_response": "Sorry, I encountered an error processing your request with the database.",
+        }
+
+async def aagent_node(state):
+    logger.info("Processing with SQL Agent")
+    try:
+        user_message = state.get("user_message")
+        cached = await asyncio.to_thread(_cached_answer, user_message, "agent")
+        if cached is not None:
+            return _cached_result(state, "agent_response", cached)
+        if state.get("sql_agent") is None:
+            state["sql_agent"] = await asyncio.to_thread(SQL_Agent)
+        agent_response = await state["sql_agent"].aget_agent_response(user_message)
+        logger.info("Agent response generated successfully")
+        if agent_response != AGENT_ERROR_RESPONSE:
+            await asyncio.to_thread(_remember_answer, user_message, "agent", agent_response)
         return {
             "user_message": user_message,
             "agent_response": agent_response,
+            "messages": _with_history(state, agent_response),
         }
     except Exception as e:
         logger.error(f"Error in agent node: {str(e)}")
@@ -97,32 +356,19 @@ def agent_node(state):
 def create_rag(state):
     logger.info("Creating new RAG instance")
     try:
-        # Pobierz ścieżkę do bazy danych ze zmiennych środowiskowych lub konfiguracji
-        db_path = os.environ.get("transactions_db_path")
-        if not db_path:
-            config = get_ai_config()
-            db_path = config.get("database", "path")
-            
-        if not db_path or not os.path.exists(db_path):
-            logger.error(f"Database file not found: {db_path}")
+        # Indeks jest współdzielony między sesjami i trzymany na dysku obok bazy transakcji
+        try:
+            index_store = get_index_store()
+        except FileNotFoundError as e:
+            logger.error(str(e))
             return state
-            
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM all_transactions LIMIT 1000")  # Limit for performance
-        rows = cursor.fetchall()
-        conn.close()
-        
-        logger.info(f"Retrieved {len(rows)} transactions for RAG creation")
-        
-        if rows:
-            all_text = "\n".join([str(item) for item in rows])
-            docs = [Document(page_content=all_text)]
-            embeddings = OpenAIEmbeddings()
-            vectorstore = FAISS.from_documents(docs, embeddings)
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 1})
-            llm = state["evaluate_sql_statement_agent"].llm
-            state["rag"] = AdaptiveRAG(llm, retriever, vectorstore)
+
+        if state.get("evaluate_sql_statement_agent") is None:
+            state["evaluate_sql_statement_agent"] = SQLQueryEvaluatorAgent()
+        rag = get_shared_rag(state["evaluate_sql_statement_agent"].llm)
+        if rag is not None:
+            state["rag"] = rag
+            state["rag_index"] = str(index_store.index_dir)
             logger.info("RAG created successfully")
         else:
             logger.warning("No transactions found for RAG creation")
@@ -131,20 +377,106 @@ def create_rag(state):
         logger.error(f"Error creating RAG: {str(e)}")
         return state
 
+async def acreate_rag(state):
+    # Budowa/wczytanie indeksu to praca CPU i dysku - poza pętlą zdarzeń
+    return await asyncio.to_thread(create_rag, state)
+
+# Węzły mają wersje synchroniczne (invoke/stream) i asynchroniczne (ainvoke/astream)
 builder = StateGraph(State)
-builder.add_node("Node1", node_1)
-builder.add_node("rag_response_node", rag_node)
-builder.add_node("agent_response_node", agent_node)
-builder.add_node("evaluate_sql_statement", evaluate_sql_statement)
-builder.add_node("create_rag", create_rag)
+builder.add_node("Node1", RunnableLambda(node_1, afunc=anode_1))
+builder.add_node("rag_response_node", RunnableLambda(rag_node, afunc=arag_node))
+builder.add_node("agent_response_node", RunnableLambda(agent_node, afunc=aagent_node))
+builder.add_node("evaluate_sql_statement", RunnableLambda(evaluate_sql_statement, afunc=aevaluate_sql_statement))
+builder.add_node("create_rag", RunnableLambda(create_rag, afunc=acreate_rag))
 
 builder.add_edge(START, "Node1")
-builder.add_conditional_edges("Node1", lambda state: "rag_response_node" if state.get("rag") is not None else "evaluate_sql_statement")
+builder.add_conditional_edges("Node1", lambda state: "rag_response_node" if state.get("rag") is not None
+                              else "evaluate_sql_statement")
 builder.add_conditional_edges("evaluate_sql_statement", lambda state: "create_rag" if state.get("is_sql_query_heavy") == "YES" else "agent_response_node")
 builder.add_edge("create_rag", "rag_response_node")
 builder.add_edge("rag_response_node", END)
 builder.add_edge("agent_response_node", END)
 
 
+class _AnswerTokens:
+    """
+    Wybiera z tokenów LLM tylko odpowiedź końcową: w RAG wywołanie oznaczone
+    FINAL_ANSWER_TAG albo tekst po "ANSWER:" z połączonego wywołania analiza +
+    odpowiedź, w agencie SQL tekst po "Final Answer:".
+    """
+
+    def __init__(self):
+        self.streamed = False
+        self._buffers = {}
+
+    def _after_marker(self, chunk, text, marker):
+        buffer = self._buffers.get(chunk.id, "") + text
+        self._buffers[chunk.id] = buffer
+        position = buffer.find(marker)
+        if position == -1:
+            return ""
+        piece = buffer[max(position + len(marker), len(buffer) - len(text)):]
+        return piece if self.streamed else piece.lstrip()
+
+    def select(self, chunk, metadata):
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if not text:
+            return ""
+        node = metadata.get("langgraph_node")
+        tags = metadata.get("tags") or []
+        if node == "rag_response_node" and FINAL_ANSWER_TAG in tags:
+            piece = text
+        elif node == "rag_response_node" and FUSED_ANSWER_TAG in tags:
+            piece = self._after_marker(chunk, text, FUSED_ANSWER_MARKER)
+        elif node == "agent_response_node":
+            piece = self._after_marker(chunk, text, REACT_FINAL_ANSWER)
+        else:
+            return ""
+        if piece:
+            self.streamed = True
+        return piece
+
+    def remainder(self, final_state):
+        """Cała odpowiedź, jeśli nic nie popłynęło (np. błąd węzła)."""
+        if self.streamed:
+            return ""
+        return final_state.get("rag_response") or final_state.get("agent_response") or ""
+
+
+def stream_answer(graph, state):
+    """
+    Uruchom graf i oddawaj na bieżąco tokeny odpowiedzi końcowej.
+
+    Zwraca pary ("token", tekst), a na końcu ("state", stan końcowy). Jeśli nic
+    nie popłynęło, cała odpowiedź jest oddawana jednym kawałkiem.
+    """
+    final_state = state
+    tokens = _AnswerTokens()
+    for mode, payload in graph.stream(state, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = payload
+        elif piece := tokens.select(*payload):
+            yield "token", piece
+
+    if remainder := tokens.remainder(final_state):
+        yield "token", remainder
+    yield "state", final_state
+
+
+async def astream_answer(graph, state):
+    """Asynchroniczny odpowiednik stream_answer (graph.astream)."""
+    final_state = state
+    tokens = _AnswerTokens()
+    async for mode, payload in graph.astream(state, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = payload
+        elif piece := tokens.select(*payload):
+            yield "token", piece
+
+    if remainder := tokens.remainder(final_state):
+        yield "token", remainder
+    yield "state", final_state
+
+
 def get_dynamic_rag_graph():
     return builder.compile()
\ No newline at end of file
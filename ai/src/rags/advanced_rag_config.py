@@ -1,8 +1,45 @@
+import os
+import sys
+import asyncio
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain.chains.combine_documents.stuff import create_stuff_documents_chain
 from langchain.chains.retrieval import create_retrieval_chain
-from .basic_rag import BasicRAG
+from src.utils.ttl_cache import TTLCache
+from src.utils.normalization import normalize_question, question_literals
+from config.config_manager import get_ai_config
+from .basic_rag import BasicRAG, FINAL_ANSWER_TAG
+from .hybrid_retriever import HybridRetriever
+
+# Tag połączonego wywołania analiza + odpowiedź; streamowany jest tylko tekst po FUSED_ANSWER_MARKER
+FUSED_ANSWER_TAG = "fused_answer"
+FUSED_ANSWER_MARKER = "ANSWER:"
+
+# Plany zapytań współdzielone przez sesje: (pytanie znormalizowane, model) -> plan
+_config = get_ai_config()
+_analysis_cache = TTLCache(
+    max_size=_config.get("rag", "analysis_cache_size", default=1000),
+    ttl=_config.get("rag", "analysis_cache_ttl", default=3600),
+)
+_rag_calls = {"turns": 0, "llm_calls": 0, "fused_direct": 0}
+_rag_calls_lock = threading.Lock()
+
+
+def rag_stats():
+    """Liczba wywołań LLM na turę RAG i skuteczność cache planów zapytań."""
+    with _rag_calls_lock:
+        stats = dict(_rag_calls)
+    stats["avg_llm_calls_per_turn"] = round(stats["llm_calls"] / stats["turns"], 2) if stats["turns"] else 0.0
+    stats["analysis_cache"] = _analysis_cache.stats()
+    return stats
+
 
 class AdaptiveRAG:
     def __init__(self, llm, retriever, vectorstore):
@@ -12,21 +49,70 @@ class AdaptiveRAG:
         self.llm = llm
         self.retriever = retriever
         self.vectorstore = vectorstore
+        self.fused = get_ai_config().get("rag", "fused_analysis", default=True)
 
-    def query(self, query):
+    def _retriever_with_k(self, retriever, k):
+        # Zachowaj wyszukiwanie hybrydowe (FAISS + FTS5) i filtr metadanych, zmieniając tylko liczbę dokumentów
+        if isinstance(retriever, HybridRetriever):
+            return retriever.model_copy(update={"k": max(k, retriever.k)})
+        return self.vectorstore.as_retriever(search_kwargs={"k": k})
+
+    def _filtered_retriever(self, query):
+        # Ograniczenia z pytania (daty, znak kwoty, waluta, konto, kontrahent) zawężają kandydatów przed ANN
+        if isinstance(self.retriever, HybridRetriever):
+            return self.retriever.with_prefilter(query)
+        return self.retriever
+
+    @staticmethod
+    def _retrieve_sub_questions(retriever, sub_questions):
+        # Pod-pytania równolegle, z embeddingami pobranymi jednym wywołaniem modelu
+        if isinstance(retriever, HybridRetriever):
+            results = retriever.retrieve_many(sub_questions)
+        else:
+            results = retriever.batch(sub_questions)
+        return [doc for docs in results for doc in docs]
+
+    def _plan_key(self, query):
+        model = getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+        return normalize_question(query), model
+
+    def _cached_plan(self, query):
         """
-        Analyze the query complexity and determine retrieval strategy
+        Plan z cache dla podobnego pytania. Pod-pytania zawierają konkretne daty i kwoty,
+        więc są używane tylko przy tych samych wartościach - inaczej zostaje sama złożoność.
         """
-        analysis_prompt = PromptTemplate.from_template(
+        plan = _analysis_cache.get(self._plan_key(query))
+        if plan is None:
+            return None
+        complexity, decomposition, keywords, literals = plan
+        if decomposition and literals != question_literals(query):
+            decomposition = []
+        return complexity, decomposition, keywords
+
+    def _store_plan(self, query, plan):
+        complexity, decomposition, keywords = plan
+        _analysis_cache.set(self._plan_key(query), (complexity, decomposition, keywords, question_literals(query)))
+
+    @staticmethod
+    def _count_turn(llm_calls, fused_direct=False):
+        with _rag_calls_lock:
+            _rag_calls["turns"] += 1
+            _rag_calls["llm_calls"] += llm_calls
+            if fused_direct:
+                _rag_calls["fused_direct"] += 1
+
+    @staticmethod
+    def _analysis_prompt():
+        return PromptTemplate.from_template(
             """
             Analyze the following question and determine the best retrieval strategy:
-            
+
             Question: {question}
-            
+
             1. Is this a simple factual question or a complex question requiring deep understanding?
             2. Should we decompose this question into sub-questions? If so, provide 2-3 sub-questions.
             3. What specific keywords or concepts should we focus on when retrieving documents?
-            
+
             Respond in the following format:
             COMPLEXITY: [SIMPLE/COMPLEX]
             DECOMPOSITION: [NONE/SUB-QUESTIONS LIST]
@@ -34,10 +120,8 @@ class AdaptiveRAG:
             """
         )
 
-        analysis_chain = LLMChain(llm=self.llm, prompt=analysis_prompt)
-        analysis_result = analysis_chain.run(question=query)
-
-        # Parse the analysis result
+    @staticmethod
+    def _parse_analysis(analysis_result):
         complexity = "SIMPLE"
         decomposition = []
         keywords = []
@@ -53,75 +137,160 @@ class AdaptiveRAG:
                 keywords_text = line.replace("KEYWORDS:", "").strip()
                 keywords = [k.strip() for k in keywords_text.split(",")]
 
+        return complexity, decomposition, keywords
+
+    @staticmethod
+    def _fused_prompt(query, docs):
+        prompt = PromptTemplate.from_template(
+            """
+            You answer questions about the user's bank transactions.
+
+            Context:
+            {context}
+
+            Question: {question}
+
+            If the question needs data for several separate periods, counterparties or categories
+            that the context above does not cover, do not answer. Reply only with:
+            PLAN: DECOMPOSE
+            DECOMPOSITION: [2-3 sub-questions separated by commas]
+
+            Otherwise reply with:
+            PLAN: DIRECT
+            ANSWER: [your answer based only on the context]
+            """
+        )
+        context = "\n\n".join(doc.page_content for doc in docs)
+        return prompt.format(question=query, context=context)
+
+    @staticmethod
+    def _parse_fused(output):
+        """Rozbierz odpowiedź połączonego wywołania na (plan, odpowiedź albo None)."""
+        marker = output.find(FUSED_ANSWER_MARKER)
+        if marker != -1:
+            return ("SIMPLE", [], []), output[marker + len(FUSED_ANSWER_MARKER):].strip()
+
+        decomposition = []
+        for line in output.split("\n"):
+            line = line.strip()
+            if line.startswith("DECOMPOSITION:"):
+                decomp_text = line.replace("DECOMPOSITION:", "").strip()
+                if decomp_text != "NONE":
+                    decomposition = [q.strip() for q in decomp_text.split(",") if q.strip()]
+        if decomposition:
+            return ("COMPLEX", decomposition, []), None
+        # Model zignorował format - traktuj całość jako odpowiedź
+        return ("SIMPLE", [], []), output.strip()
+
+    @staticmethod
+    def _unique_documents(all_docs):
+        # Remove duplicates while preserving order
+        seen_content = set()
+        unique_docs = []
+        for doc in all_docs:
+            if doc.page_content not in seen_content:
+                seen_content.add(doc.page_content)
+                unique_docs.append(doc)
+        return unique_docs
+
+    @staticmethod
+    def _decomposed_answer_prompt(query, decomposition, unique_docs):
+        # Use a more detailed prompt that acknowledges the decomposition
+        prompt = PromptTemplate.from_template(
+            """
+            I've broken down your complex question into sub-questions and retrieved relevant information for each.
+
+            Original question: {question}
+
+            Sub-questions analyzed:
+            {sub_questions}
+
+            Please answer the original question based on this context:
+            {context}
+
+            Provide a comprehensive answer that addresses all aspects of the original question.
+            """
+        )
+
+        # Create a context string to pass to the LLM
+        context = "\n\n".join([doc.page_content for doc in unique_docs[:6]])  # Limit to 6 docs
+        sub_questions_text = "\n".join([f"- {sq}" for sq in decomposition])
+        return prompt.format(question=query, sub_questions=sub_questions_text, context=context)
+
+    def _complex_retrieval_chain(self, retriever):
+        # For other complex questions, use hybrid search with more documents
+        enhanced_retriever = self._retriever_with_k(retriever, 6)
+
+        # Create a standard RAG prompt but request a more comprehensive answer
+        prompt = PromptTemplate.from_template(
+            """
+            Answer the following complex question based on the provided context:
+
+            Context:
+            {context}
+
+            Question: {question}
+
+            Provide a comprehensive and detailed answer.
+            """
+        )
+
+        document_chain = create_stuff_documents_chain(self.llm.with_config(tags=[FINAL_ANSWER_TAG]), prompt)
+        return create_retrieval_chain(enhanced_retriever, document_chain)
+
+    def query(self, query):
+        """
+        Analyze the query complexity and determine retrieval strategy
+        """
+        retriever = self._filtered_retriever(query)
+        llm_calls = 0
+
+        plan = self._cached_plan(query)
+        if plan is None and self.fused:
+            # Jedno wywołanie: odpowiedź na dokumentach pytania albo plan dekompozycji
+            docs = retriever.invoke(query)
+            output = self.llm.invoke(
+                self._fused_prompt(query, docs), config={"tags": [FUSED_ANSWER_TAG]}
+            ).content
+            llm_calls += 1
+            plan, answer = self._parse_fused(output)
+            self._store_plan(query, plan)
+            if answer is not None:
+                self._count_turn(llm_calls, fused_direct=True)
+                return {
+                    "query": query,
+                    "answer": answer,
+                    "source_documents": docs,
+                    "strategy": "Single-call analysis and answer",
+                    "llm_calls": llm_calls,
+                }
+        elif plan is None:
+            analysis_chain = LLMChain(llm=self.llm, prompt=self._analysis_prompt())
+            plan = self._parse_analysis(analysis_chain.run(question=query))
+            llm_calls += 1
+            self._store_plan(query, plan)
+
+        complexity, decomposition, keywords = plan
+
         # Step 2: Adjust retrieval strategy based on analysis
         if complexity == "SIMPLE":
             # For simple questions, use standard retrieval
-            basic_rag = BasicRAG(self.llm, self.retriever)
+            basic_rag = BasicRAG(self.llm, retriever)
             result = basic_rag.query(query)
             result["strategy"] = "Standard retrieval for a simple question"
-            return result
 
         elif decomposition and len(decomposition) > 0:
             # For complex questions that can be decomposed, retrieve for each sub-question
-            sub_results = []
-
-            for sub_q in decomposition:
-                # Get documents for each sub-question
-                sub_docs = self.retriever.get_relevant_documents(sub_q)
-                sub_results.append({
-                    "sub_question": sub_q,
-                    "documents": sub_docs
-                })
-
-            # Combine all retrieved documents
-            all_docs = []
-            for sub_result in sub_results:
-                all_docs.extend(sub_result["documents"])
-
-            # Remove duplicates while preserving order
-            seen_content = set()
-            unique_docs = []
-            for doc in all_docs:
-                if doc.page_content not in seen_content:
-                    seen_content.add(doc.page_content)
-                    unique_docs.append(doc)
-
-            # Use a more detailed prompt that acknowledges the decomposition
-            prompt = PromptTemplate.from_template(
-                """
-                I've broken down your complex question into sub-questions and retrieved relevant information for each.
-                
-                Original question: {question}
-                
-                Sub-questions analyzed:
-                {sub_questions}
-                
-                Please answer the original question based on this context:
-                {context}
-                
-                Provide a comprehensive answer that addresses all aspects of the original question.
-                """
-            )
-
-            document_chain = create_stuff_documents_chain(
-                self.llm, 
-                prompt
-            )
-
-            # Create a context string to pass to the LLM
-            context = "\n\n".join([doc.page_content for doc in unique_docs[:6]])  # Limit to 6 docs
-            sub_questions_text = "\n".join([f"- {sq}" for sq in decomposition])
+            all_docs = self._retrieve_sub_questions(retriever, decomposition)
+            unique_docs = self._unique_documents(all_docs)
 
             # Generate answer
             answer = self.llm.invoke(
-                prompt.format(
-                    question=query, 
-                    sub_questions=sub_questions_text, 
-                    context=context
-                )
+                self._decomposed_answer_prompt(query, decomposition, unique_docs),
+                config={"tags": [FINAL_ANSWER_TAG]},
             ).content
 
-            return {
+            result = {
                 "query": query,
                 "answer": answer,
                 "source_documents": unique_docs,
@@ -129,31 +298,84 @@ class AdaptiveRAG:
             }
 
         else:
-            # For other complex questions, use hybrid search with more documents
-            enhanced_retriever = self.vectorstore.as_retriever(search_kwargs={"k": 6})
-
-            # Create a standard RAG prompt but request a more comprehensive answer
-            prompt = PromptTemplate.from_template(
-                """
-                Answer the following complex question based on the provided context:
-                
-                Context:
-                {context}
-                
-                Question: {question}
-                
-                Provide a comprehensive and detailed answer.
-                """
-            )
-
-            document_chain = create_stuff_documents_chain(self.llm, prompt)
-            retrieval_chain = create_retrieval_chain(enhanced_retriever, document_chain)
-
-            result = retrieval_chain.invoke({"query": query})
-
-            return {
+            chain_result = self._complex_retrieval_chain(retriever).invoke({"input": query, "question": query})
+
+            result = {
                 "query": query,
-                "answer": result["answer"],
-                "source_documents": result["context"],
+                "answer": chain_result["answer"],
+                "source_documents": chain_result["context"],
                 "strategy": "Enhanced retrieval for a complex question"
-            }
\ No newline at end of file
+            }
+
+        result["llm_calls"] = llm_calls + 1
+        self._count_turn(result["llm_calls"])
+        return result
+
+    async def aquery(self, query):
+        """
+        Asynchroniczny odpowiednik query - wywołania LLM przez ainvoke, bez blokowania wątku
+        """
+        # Prefiltr odpytuje SQLite i odtwarza wektory z FAISS - poza pętlą zdarzeń
+        retriever = await asyncio.to_thread(self._filtered_retriever, query)
+        llm_calls = 0
+
+        plan = self._cached_plan(query)
+        if plan is None and self.fused:
+            docs = await retriever.ainvoke(query)
+            output = (await self.llm.ainvoke(
+                self._fused_prompt(query, docs), config={"tags": [FUSED_ANSWER_TAG]}
+            )).content
+            llm_calls += 1
+            plan, answer = self._parse_fused(output)
+            self._store_plan(query, plan)
+            if answer is not None:
+                self._count_turn(llm_calls, fused_direct=True)
+                return {
+                    "query": query,
+                    "answer": answer,
+                    "source_documents": docs,
+                    "strategy": "Single-call analysis and answer",
+                    "llm_calls": llm_calls,
+                }
+        elif plan is None:
+            analysis_chain = LLMChain(llm=self.llm, prompt=self._analysis_prompt())
+            plan = self._parse_analysis(await analysis_chain.arun(question=query))
+            llm_calls += 1
+            self._store_plan(query, plan)
+
+        complexity, decomposition, keywords = plan
+
+        if complexity == "SIMPLE":
+            basic_rag = BasicRAG(self.llm, retriever)
+            result = await basic_rag.aquery(query)
+            result["strategy"] = "Standard retrieval for a simple question"
+
+        elif decomposition and len(decomposition) > 0:
+            all_docs = await asyncio.to_thread(self._retrieve_sub_questions, retriever, decomposition)
+            unique_docs = self._unique_documents(all_docs)
+
+            answer = (await self.llm.ainvoke(
+                self._decomposed_answer_prompt(query, decomposition, unique_docs),
+                config={"tags": [FINAL_ANSWER_TAG]},
+            )).content
+
+            result = {
+                "query": query,
+                "answer": answer,
+                "source_documents": unique_docs,
+                "strategy": f"Decomposed into {len(decomposition)} sub-questions"
+            }
+
+        else:
+            chain_result = await self._complex_retrieval_chain(retriever).ainvoke({"input": query, "question": query})
+
+            result = {
+                "query": query,
+                "answer": chain_result["answer"],
+                "source_documents": chain_result["context"],
+                "strategy": "Enhanced retrieval for a complex question"
+            }
+
+        result["llm_calls"] = llm_calls + 1
+        self._count_turn(result["llm_calls"])
+        return result
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+import numpy as np
+from src.rags.embeddings import get_embeddings
+from src.utils.ttl_cache import TTLCache
+from src.utils.normalization import question_literals
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    Cache odpowiedzi adresowany znaczeniem pytania.
+
+    Wpis to (embedding pytania, trasa, odpowiedź, wersja danych, ograniczenia pytania).
+    Nowe pytanie dostaje zapisaną odpowiedź, gdy podobieństwo kosinusowe przekracza
+    próg, dane transakcji się nie zmieniły, a ograniczenia (daty, znak kwoty, waluta,
+    konto, kontrahent) oraz liczby z pytania są te same - "ile wydałem w maju?"
+    i "how much did I spend in May" trafiają w ten sam wpis, ale maj i czerwiec
+    albo "ostatnie 10" i "ostatnie 20 transakcji" już nie. LRU + TTL.
+    """
+
+    def __init__(self, embeddings, threshold=0.93, max_size=500, ttl=3600):
+        self.embeddings = embeddings
+        self.threshold = float(threshold)
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.misses = 0
+        self.evictions = 0
+        self._routes = {}
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._matrix = None
+        self._matrix_ids = []
+        self._vectors = TTLCache(max_size=256, ttl=300)  # embeddingi ostatnich pytań (lookup -> store)
+        self._lock = threading.Lock()
+
+    def _embed(self, question):
+        vector = self._vectors.get(question)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+            self._vectors.set(question, vector)
+        return vector
+
+    def _route_stats(self, route):
+        return self._routes.setdefault(route, {"hits": 0, "stores": 0})
+
+    def _drop_expired(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if self.ttl and entry["expires_at"] < now]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def _search_matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = (np.stack([self._entries[i]["vector"] for i in self._matrix_ids])
+                            if self._matrix_ids else None)
+        return self._matrix, self._matrix_ids
+
+    @staticmethod
+    def _signature(question, constraints):
+        # Embeddingi słabo rozróżniają liczby ("ponad 100" / "ponad 1000 PLN") - muszą się zgadzać dosłownie
+        return json.dumps({"constraints": constraints or {}, "literals": question_literals(question)},
+                          sort_keys=True)
+
+    def lookup(self, question, data_version, constraints=None, route=None):
+        """Zwróć (odpowiedź, trasa, podobieństwo) dla podobnego pytania (opcjonalnie tylko z trasy) albo None."""
+        vector = self._embed(question)
+        signature = self._signature(question, constraints)
+        now = time.monotonic()
+        with self._lock:
+            self._drop_expired(now)
+            matrix, ids = self._search_matrix()
+            if matrix is not None:
+                similarities = matrix @ vector
+                for position in np.argsort(-similarities):
+                    similarity = float(similarities[position])
+                    if similarity < self.threshold:
+                        break
+                    entry = self._entries[ids[position]]
+                    if (entry["data_version"] != data_version or entry["signature"] != signature
+                            or (route is not None and entry["route"] != route)):
+                        continue
+                    self._entries.move_to_end(ids[position])
+                    self._route_stats(entry["route"])["hits"] += 1
+                    logger.info(f"Semantic answer cache hit ({entry['route']}, similarity {similarity:.3f}) "
+                                f"for: {question[:50]}")
+                    return entry["answer"], entry["route"], similarity
+            self.misses += 1
+            return None
+
+    def store(self, question, route, answer, data_version, constraints=None):
+        vector = self._embed(question)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": vector,
+                "route": route,
+                "question": question,
+                "answer": answer,
+                "data_version": data_version,
+                "signature": self._signature(question, constraints),
+                "expires_at": time.monotonic() + self.ttl if self.ttl else float("inf"),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+            self._route_stats(route)["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            hits = sum(route["hits"] for route in self._routes.values())
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "routes": {name: dict(route) for name, route in self._routes.items()},
+            }
+
+
+# Globalna instancja
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Pobierz globalny cache odpowiedzi albo None, gdy rag.answer_cache jest wyłączony."""
+    global _answer_cache
+    config = get_ai_config()
+    if not config.get("rag", "answer_cache", default=True):
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                get_embeddings(),
+                # Osobny, surowy próg - rag.similarity_threshold dotyczy wyszukiwania dokumentów,
+                # a tu trafienie oznacza zwrócenie gotowej odpowiedzi na inne pytanie
+                threshold=config.get("rag", "answer_cache_similarity_threshold", default=0.93),
+                max_size=config.get("rag", "answer_cache_size", default=500),
+                ttl=config.get("rag", "answer_cache_ttl", default=3600),
+            )
+        return _answer_cache
+
+
+def answer_cache_stats():
+    return _answer_cache.stats() if _answer_cache is not None else None
@@ -2,6 +2,9 @@ from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.prompts import PromptTemplate
 
+# Tag wywołania LLM generującego odpowiedź końcową - tylko jego tokeny są streamowane do czatu
+FINAL_ANSWER_TAG = "final_answer"
+
 class BasicRAG:
     def __init__(self, llm, retriever):
         self.llm = llm
@@ -24,7 +27,9 @@ class BasicRAG:
         )
     
     # Create a document chain that combines the documents
-        self.document_chain = create_stuff_documents_chain(self.llm, self.prompt)
+        self.document_chain = create_stuff_documents_chain(
+            self.llm.with_config(tags=[FINAL_ANSWER_TAG]), self.prompt
+        )
         
         # Create a retrieval chain that uses the retriever and document chain
         self.retrieval_chain = create_retrieval_chain(self.retriever, self.document_chain)
@@ -38,4 +43,14 @@ class BasicRAG:
             "query": query,
             "answer": result["answer"],
             "source_documents": result["context"]
-        }
\ No newline at end of file
+        }
+
+    async def aquery(self, query):
+        # Asynchroniczny odpowiednik query
+        result = await self.retrieval_chain.ainvoke({"input": query})
+
+        return {
+            "query": query,
+            "answer": result["answer"],
+            "source_documents": result["context"]
+        }
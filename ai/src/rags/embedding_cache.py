@@ -0,0 +1,139 @@
+import os
+import sys
+import hashlib
+import sqlite3
+import threading
+from array import array
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from langchain_core.embeddings import Embeddings
+from config.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Cache embeddingów adresowany treścią, trzymany w lokalnym pliku SQLite.
+
+    Kluczem jest (model, sha256 tekstu), wektory są zapisywane jako BLOB float32.
+    Przebudowy indeksu, restarty i powtarzające się zapytania trafiają w cache
+    zamiast w API.
+    """
+
+    def __init__(self, embeddings, model_name, cache_path):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = str(cache_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, "
+            "text_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _encode(vector):
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(blob):
+        vector = array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    def _lookup(self, hashes):
+        conn = self._connection()
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        # Limit parametrów SQLite - pytaj porcjami
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *chunk],
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = self._decode(blob)
+        return found
+
+    def _store(self, items):
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [(self.model_name, text_hash, self._encode(vector)) for text_hash, vector in items],
+        )
+        conn.commit()
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def embed_documents(self, texts):
+        hashes = [self._hash(text) for text in texts]
+        cached = self._lookup(hashes)
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        self._count(len(texts) - len(missing), len(missing))
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text):
+        text_hash = self._hash(text)
+        cached = self._lookup([text_hash])
+        if text_hash in cached:
+            self._count(1, 0)
+            return cached[text_hash]
+
+        vector = self.embeddings.embed_query(text)
+        self._store([(text_hash, vector)])
+        self._count(0, 1)
+        return vector
+
+    def stats(self):
+        """Zwróć liczniki trafień/chybień cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from langchain_openai import OpenAIEmbeddings
+from src.rags.embedding_cache import CachedEmbeddings
+from src.rags.local_embeddings import HashingEmbeddings
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+
+def _default_cache_path():
+    from src.agents.transactions_db import resolve_transactions_db_path
+
+    db_path = resolve_transactions_db_path()
+    base_dir = Path(db_path).parent if db_path else Path(ai_root)
+    return base_dir / "embedding_cache.db"
+
+
+def embedding_model_name():
+    """Nazwa modelu embeddingów wybranego w konfiguracji (klucz cache i manifestu indeksu)."""
+    config = get_ai_config()
+    provider = config.get("rag", "embedding_provider", default="openai")
+    if provider == "local":
+        dimensions = config.get("rag", "local_embedding_dimensions", default=512)
+        return f"local-hashing-{dimensions}"
+    return config.get("rag", "embedding_model", default="text-embedding-3-small")
+
+
+def create_embeddings():
+    """Utwórz instancję embeddingów według sekcji rag z ai_config.json (z cache SQLite)."""
+    config = get_ai_config()
+    provider = config.get("rag", "embedding_provider", default="openai")
+    model = embedding_model_name()
+
+    if provider == "local":
+        dimensions = config.get("rag", "local_embedding_dimensions", default=512)
+        logger.info(f"Using local hashing embeddings ({dimensions} dimensions)")
+        # Lokalne wektory liczą się szybciej niż odczyt z cache - bez opakowania
+        return HashingEmbeddings(dimensions=dimensions)
+    elif provider != "openai":
+        raise ValueError(f"Unknown embedding provider: {provider}. Use 'openai' or 'local'")
+
+    embeddings = OpenAIEmbeddings(model=model)
+
+    if not config.get("rag", "embedding_cache", default=True):
+        return embeddings
+
+    cache_path = config.get("rag", "embedding_cache_path", default=None) or _default_cache_path()
+    logger.info(f"Embedding cache enabled at {cache_path}")
+    return CachedEmbeddings(embeddings, model, cache_path)
+
+
+# Globalny instance
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """Pobierz współdzieloną instancję embeddingów (indeks i zapytania)."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = create_embeddings()
+        return _embeddings
+
+
+def get_embedding_stats():
+    """Zwróć statystyki cache embeddingów (None, gdy cache jest wyłączony)."""
+    if isinstance(_embeddings, CachedEmbeddings):
+        return _embeddings.stats()
+    return None
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """Połącz kilka rankingów id dokumentów metodą Reciprocal Rank Fusion."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever łączący wyszukiwanie wektorowe FAISS z BM25 z indeksu FTS5.
+
+    Oba rankingi są łączone przez RRF, więc dokładne dopasowania słów
+    kluczowych trafiają do wyników nawet przy małym k wyszukiwania wektorowego.
+    """
+
+    vectorstore: Any
+    keyword_index: Any = None
+    k: int = 10
+    vector_k: int = 10
+    keyword_k: int = 10
+    rrf_k: int = 60
+    # Filtr metadanych: pytanie -> lista id transakcji (None = brak ograniczeń)
+    prefilter: Optional[Callable] = None
+    # Wyszukiwanie wektorowe zawężone do kandydatów: (pytanie, id transakcji, k, embedding) -> dokumenty
+    candidate_search: Optional[Callable] = None
+    candidate_ids: Optional[List[int]] = None
+
+    def with_prefilter(self, question):
+        """Kopia retrievera zawężona do transakcji pasujących do ograniczeń z pytania."""
+        if self.prefilter is None or self.candidate_search is None:
+            return self
+        candidate_ids = self.prefilter(question)
+        if candidate_ids is None:
+            return self
+        return self.model_copy(update={"candidate_ids": candidate_ids})
+
+    def _document_id(self, doc):
+        return doc.id or f"txn-{doc.metadata.get('id')}"
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._retrieve(query)
+
+    def _retrieve(self, query, embedding=None):
+        if self.candidate_ids is not None:
+            allowed_ids = set(self.candidate_ids)
+            vector_docs = self.candidate_search(query, self.candidate_ids, self.vector_k, embedding=embedding)
+        else:
+            allowed_ids = None
+            if embedding is not None:
+                vector_docs = self.vectorstore.similarity_search_by_vector(embedding, k=self.vector_k)
+            else:
+                vector_docs = self.vectorstore.similarity_search(query, k=self.vector_k)
+
+        keyword_hits = []
+        if self.keyword_index is not None:
+            keyword_hits = self.keyword_index.search(query, k=self.keyword_k, allowed_ids=allowed_ids)
+
+        documents = {self._document_id(doc): doc for doc in vector_docs}
+        vector_ranking = list(documents)
+        keyword_ranking = [doc_id for doc_id, _ in keyword_hits]
+
+        fused = reciprocal_rank_fusion([vector_ranking, keyword_ranking], rrf_k=self.rrf_k)
+
+        results = []
+        for doc_id in fused[:self.k]:
+            doc = documents.get(doc_id)
+            if doc is None:
+                doc = self.vectorstore.docstore.search(doc_id)
+                if not isinstance(doc, Document):
+                    continue  # Indeks słów kluczowych wyprzedził indeks wektorowy
+            results.append(doc)
+        return results
+
+    def retrieve_many(self, queries):
+        """
+        Dokumenty dla kilku pytań naraz (np. pod-pytań z dekompozycji): embeddingi
+        wszystkich pytań jednym wywołaniem modelu, potem wyszukiwania równolegle.
+        Zwraca listy dokumentów w kolejności pytań.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        embeddings = self.vectorstore.embeddings.embed_documents(queries)
+        if len(queries) == 1:
+            return [self._retrieve(queries[0], embeddings[0])]
+        with ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="subquery") as executor:
+            return list(executor.map(self._retrieve, queries, embeddings))
@@ -0,0 +1,626 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from src.agents.transactions_db import connect_readonly, register_row_checksum, resolve_transactions_db_path
+from src.agents.sql_query_cache import db_version_stamp
+from src.rags.embeddings import get_embeddings, embedding_model_name
+from src.rags.keyword_index import KeywordIndex
+from src.rags.hybrid_retriever import HybridRetriever
+from src.rags.query_filters import extract_constraints, has_constraints, constraints_to_sql, WORD
+from src.rags.transaction_documents import build_transaction_documents, transaction_doc_id
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 3
+KEYWORD_INDEX_FILE = "keywords.db"
+# Zakres id jednej sumy kontrolnej w manifeście - odświeżanie czyta ponownie tylko zmienione zakresy
+CHECKSUM_BUCKET_SIZE = 1000
+
+
+class TransactionIndexStore:
+    """
+    Trwały indeks FAISS dla tabeli all_transactions.
+
+    Indeks jest budowany raz, zapisywany obok bazy transakcji razem z manifestem
+    (liczba wierszy + odcisk danych) i wczytywany przy starcie. Przebudowa
+    następuje tylko wtedy, gdy dane w bazie faktycznie się zmieniły.
+
+    Odświeżanie zmienia kopię indeksu i podmienia self.vectorstore jednym
+    przypisaniem - wyszukiwania w toku czytają spójną, starszą wersję bez blokady.
+    """
+
+    def __init__(self, db_path, index_dir=None, embeddings=None):
+        config = get_ai_config()
+        self.db_path = db_path
+        self.embedding_model = embedding_model_name()
+        self.index_dir = Path(index_dir or config.get("rag", "index_path", default=None)
+                              or self._default_index_dir(db_path))
+        self.embeddings = embeddings or get_embeddings()
+        self.batch_size = int(config.get("rag", "index_batch_size", default=500))
+        self.embedding_concurrency = max(1, int(config.get("rag", "embedding_concurrency", default=4)))
+        self.hybrid_search = config.get("rag", "hybrid_search", default=True)
+        self.keyword_index = KeywordIndex(self.index_dir / KEYWORD_INDEX_FILE) if self.hybrid_search else None
+        self.exact_search_limit = int(config.get("rag", "exact_search_limit", default=50000))
+        self.vectorstore = None
+        self.manifest = None
+        self._data_version = None
+        self._positions = None
+        self._filter_vocabulary = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _default_index_dir(db_path):
+        db_file = Path(db_path)
+        return db_file.parent / f"{db_file.stem}_faiss_index"
+
+    def _connect(self):
+        return connect_readonly(self.db_path)
+
+    def data_fingerprint(self):
+        """Policz tani odcisk danych (liczba wierszy, zakres id, sumy kontrolne)."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(id), TOTAL(amount), "
+                "COALESCE(MAX(booking_date_time), '') FROM all_transactions"
+            ).fetchone()
+        finally:
+            conn.close()
+
+        row_count = row[0]
+        digest = hashlib.sha256(
+            json.dumps([self.embedding_model, *row], default=str).encode("utf-8")
+        ).hexdigest()
+        return {"row_count": row_count, "fingerprint": digest}
+
+    def _read_manifest(self):
+        manifest_path = self.index_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Cannot read index manifest {manifest_path}: {str(e)}")
+            return None
+
+    def _write_manifest(self, manifest):
+        manifest_path = self.index_dir / MANIFEST_FILE
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def _is_compatible(self, manifest):
+        return (
+            manifest is not None
+            and manifest.get("version") == MANIFEST_VERSION
+            and manifest.get("embedding_model") == self.embedding_model
+        )
+
+    def _is_fresh(self, manifest, current):
+        return (
+            self._is_compatible(manifest)
+            and manifest.get("row_count") == current["row_count"]
+            and manifest.get("fingerprint") == current["fingerprint"]
+        )
+
+    def _high_water_mark(self):
+        conn = self._connect()
+        try:
+            max_id, max_booking = conn.execute(
+                "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(booking_date_time), '') FROM all_transactions"
+            ).fetchone()
+        finally:
+            conn.close()
+        return {"id": max_id, "booking_date_time": max_booking}
+
+    def _checksum_buckets(self, max_id):
+        """{zakres id: [liczba wierszy, suma row_checksum]} dla wierszy do max_id - jedno zapytanie agregujące."""
+        conn = register_row_checksum(self._connect())
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(all_transactions)")]
+            rows = conn.execute(
+                f"SELECT id / ?, COUNT(*), SUM(row_checksum({', '.join(columns)})) "
+                "FROM all_transactions WHERE id <= ? GROUP BY 1",
+                (CHECKSUM_BUCKET_SIZE, max_id),
+            ).fetchall()
+        finally:
+            conn.close()
+        return {str(bucket): [count, checksum] for bucket, count, checksum in rows}
+
+    def _save(self, vectorstore, current, documents, high_water_mark, buckets):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        vectorstore.save_local(str(self.index_dir))
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "row_count": current["row_count"],
+            "fingerprint": current["fingerprint"],
+            "documents": documents,
+            "high_water_mark": high_water_mark,
+            "checksum_buckets": buckets,
+            "built_at": (self.manifest or {}).get("built_at", time.strftime("%Y-%m-%dT%H:%M:%S")),
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._write_manifest(manifest)
+        self.manifest = manifest
+
+    def iter_document_batches(self, query="SELECT * FROM all_transactions", params=()):
+        """Czytaj tabelę porcjami przez fetchmany i leniwie zamieniaj wiersze na dokumenty."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield build_transaction_documents(rows)
+        finally:
+            conn.close()
+
+    def _embed_batch(self, documents):
+        texts = [doc.page_content for _, doc in documents]
+        return documents, self.embeddings.embed_documents(texts)
+
+    def _add_embedded_batch(self, vectorstore, documents, vectors):
+        ids = [doc_id for doc_id, _ in documents]
+        texts = [doc.page_content for _, doc in documents]
+        metadatas = [doc.metadata for _, doc in documents]
+        text_embeddings = list(zip(texts, vectors))
+        if self.keyword_index is not None:
+            self.keyword_index.add(documents)
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return vectorstore
+
+    def embed_into(self, vectorstore, batches, total=None):
+        """
+        Osadź porcje dokumentów (z ograniczoną współbieżnością) i dopisuj je do indeksu.
+
+        W locie jest najwyżej embedding_concurrency porcji, więc zużycie pamięci
+        nie zależy od rozmiaru tabeli.
+        """
+        start = time.perf_counter()
+        processed = 0
+        pending = deque()
+
+        def collect(future):
+            nonlocal vectorstore, processed
+            documents, vectors = future.result()
+            vectorstore = self._add_embedded_batch(vectorstore, documents, vectors)
+            processed += len(documents)
+            elapsed = time.perf_counter() - start
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            progress = f"{processed}/{total}" if total else f"{processed}"
+            logger.info(f"Indexed {progress} transactions ({rate:.0f} rows/s)")
+
+        with ThreadPoolExecutor(max_workers=self.embedding_concurrency,
+                                thread_name_prefix="embed") as executor:
+            for documents in batches:
+                if not documents:
+                    continue
+                pending.append(executor.submit(self._embed_batch, documents))
+                if len(pending) >= self.embedding_concurrency:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+
+        return vectorstore, processed
+
+    def _build(self, current):
+        start = time.perf_counter()
+        high_water_mark = self._high_water_mark()
+        if self.keyword_index is not None:
+            self.keyword_index.rebuild(())
+        vectorstore, processed = self.embed_into(
+            None,
+            self.iter_document_batches("SELECT * FROM all_transactions WHERE id <= ?", (high_water_mark["id"],)),
+            total=current["row_count"],
+        )
+        if vectorstore is None:
+            logger.warning("No transactions found for index build")
+            return None
+
+        self.manifest = None
+        self._save(vectorstore, current, processed, high_water_mark, self._checksum_buckets(high_water_mark["id"]))
+        logger.info(f"Transaction index built ({processed} documents) and saved to {self.index_dir} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return vectorstore
+
+    @staticmethod
+    def _indexed_transaction_ids(vectorstore, ranges):
+        ids = set()
+        for doc_id in vectorstore.index_to_docstore_id.values():
+            if doc_id.startswith("txn-"):
+                transaction_id = int(doc_id[len("txn-"):])
+                if any(low <= transaction_id <= high for low, high in ranges):
+                    ids.add(transaction_id)
+        return ids
+
+    def _iter_batches_by_ids(self, ids):
+        ids = sorted(ids)
+        for i in range(0, len(ids), self.batch_size):
+            chunk = ids[i:i + self.batch_size]
+            placeholders = ",".join("?" * len(chunk))
+            yield from self.iter_document_batches(
+                f"SELECT * FROM all_transactions WHERE id IN ({placeholders})", chunk
+            )
+
+    def _changed_ranges(self, buckets, previous_mark, full=False):
+        """
+        Zakresy id (do poprzedniego znacznika), których suma kontrolna różni się od zapisanej
+        w manifeście; full=True zwraca wszystkie zakresy.
+        """
+        stored = {} if full else (self.manifest or {}).get("checksum_buckets") or {}
+        ranges = []
+        for bucket in sorted(set(buckets) | set(stored), key=int):
+            low = int(bucket) * CHECKSUM_BUCKET_SIZE
+            if low > previous_mark or (stored and buckets.get(bucket) == stored.get(bucket)):
+                continue
+            # Manifest bez sum kontrolnych (starszy indeks) - jednorazowo sprawdzane są wszystkie zakresy
+            ranges.append((low, min(low + CHECKSUM_BUCKET_SIZE - 1, previous_mark)))
+        return ranges
+
+    def _changed_documents(self, vectorstore, ranges):
+        """
+        Dokumenty z podanych zakresów id, których treść różni się od zapisanej w indeksie.
+        Czytane są tylko zakresy o zmienionej sumie kontrolnej; embeddingi - tylko dla zmian.
+        """
+        changed = []
+        for low, high in ranges:
+            for documents in self.iter_document_batches(
+                "SELECT * FROM all_transactions WHERE id BETWEEN ? AND ?", (low, high)
+            ):
+                for doc_id, doc in documents:
+                    stored = vectorstore.docstore.search(doc_id)
+                    stored_hash = getattr(stored, "metadata", {}).get("content_hash")
+                    if stored_hash is not None and stored_hash != doc.metadata["content_hash"]:
+                        changed.append((doc_id, doc))
+        return changed
+
+    @staticmethod
+    def _copy_vectorstore(vectorstore):
+        """Niezależna kopia indeksu FAISS i docstore - zmieniana przy odświeżaniu zamiast wersji czytanej."""
+        return FAISS(
+            embedding_function=vectorstore.embedding_function,
+            index=faiss.clone_index(vectorstore.index),
+            docstore=InMemoryDocstore(dict(vectorstore.docstore._dict)),
+            index_to_docstore_id=dict(vectorstore.index_to_docstore_id),
+            relevance_score_fn=vectorstore.override_relevance_score_fn,
+            normalize_L2=vectorstore._normalize_L2,
+            distance_strategy=vectorstore.distance_strategy,
+        )
+
+    def _apply_delta(self, current, full=False):
+        """
+        Dołóż nowe wiersze, usuń skasowane i przeindeksuj zmienione.
+
+        Koszt zależy od zmiany: nowe wiersze to id powyżej znacznika, a usunięcia
+        i edycje są szukane tylko w zakresach id o zmienionej sumie kontrolnej.
+        Zmiany trafiają do kopii indeksu, podmienianej po zapisie na dysk.
+        """
+        start = time.perf_counter()
+        previous_mark = (self.manifest or {}).get("high_water_mark", {}).get("id", 0)
+        high_water_mark = self._high_water_mark()
+        buckets = self._checksum_buckets(high_water_mark["id"])
+        ranges = self._changed_ranges(buckets, previous_mark, full)
+
+        db_ids = set()
+        if ranges:
+            conn = self._connect()
+            try:
+                for low, high in ranges:
+                    db_ids.update(row[0] for row in conn.execute(
+                        "SELECT id FROM all_transactions WHERE id BETWEEN ? AND ?", (low, high)
+                    ))
+            finally:
+                conn.close()
+        indexed_ids = self._indexed_transaction_ids(self.vectorstore, ranges) if ranges else set()
+
+        deleted_ids = indexed_ids - db_ids
+        # Wiersze poniżej poprzedniego znacznika, których brakuje w indeksie (np. import z ręcznym id)
+        missing_ids = db_ids - indexed_ids
+        changed = self._changed_documents(self.vectorstore, ranges)
+
+        vectorstore = self._copy_vectorstore(self.vectorstore)
+        if deleted_ids:
+            vectorstore.delete([transaction_doc_id(i) for i in deleted_ids])
+            if self.keyword_index is not None:
+                self.keyword_index.delete(deleted_ids)
+        if changed:
+            vectorstore.delete([doc_id for doc_id, _ in changed])
+        _, updated = self.embed_into(vectorstore, [changed[i:i + self.batch_size]
+                                                   for i in range(0, len(changed), self.batch_size)])
+
+        new_batches = self.iter_document_batches(
+            "SELECT * FROM all_transactions WHERE id > ? AND id <= ?",
+            (previous_mark, high_water_mark["id"]),
+        )
+        _, added = self.embed_into(vectorstore, new_batches)
+        _, restored = self.embed_into(vectorstore, self._iter_batches_by_ids(missing_ids))
+        added += restored
+
+        documents = len(vectorstore.index_to_docstore_id)
+        self._save(vectorstore, current, documents, high_water_mark, buckets)
+        self.vectorstore = vectorstore
+        self._filter_vocabulary = None
+        stats = {"added": added, "updated": updated, "deleted": len(deleted_ids), "documents": documents}
+        logger.info(f"Transaction index refreshed in {time.perf_counter() - start:.2f}s: {stats}")
+        return stats
+
+    def _load(self):
+        start = time.perf_counter()
+        vectorstore = FAISS.load_local(
+            str(self.index_dir),
+            self.embeddings,
+            allow_dangerous_deserialization=True,  # Pliki indeksu zapisujemy sami
+        )
+        logger.info(f"Transaction index loaded from {self.index_dir} "
+                    f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return vectorstore
+
+    def load(self):
+        """Wczytaj zapisany indeks przy starcie. Nie buduje nowego - zmiany danych dołoży refresh."""
+        with self._lock:
+            if self.vectorstore is not None:
+                return self.vectorstore
+            manifest = self._read_manifest()
+            if not self._is_compatible(manifest):
+                logger.info("No compatible transaction index on disk")
+                return None
+            try:
+                self.vectorstore = self._load()
+                self.manifest = manifest
+                self._positions = None
+                self._sync_keyword_index()
+            except Exception as e:
+                logger.warning(f"Failed to load transaction index, it will be rebuilt: {str(e)}")
+                self.vectorstore = None
+            return self.vectorstore
+
+    def _sync_keyword_index(self):
+        """Odtwórz indeks FTS z docstore, jeśli rozjechał się z indeksem wektorowym."""
+        if self.keyword_index is None:
+            return
+        documents = len(self.vectorstore.index_to_docstore_id)
+        if self.keyword_index.count() == documents:
+            return
+        logger.info("Keyword index out of sync - rebuilding it from the vector docstore")
+        self.keyword_index.rebuild(
+            (doc_id, self.vectorstore.docstore.search(doc_id))
+            for doc_id in self.vectorstore.index_to_docstore_id.values()
+        )
+
+    def get_vectorstore(self):
+        """Zwróć aktualny indeks - wczytaj go z dysku, dołóż zmiany albo zbuduj od zera."""
+        with self._lock:
+            current = self.data_fingerprint()
+            if self.vectorstore is not None and self._is_fresh(self.manifest, current):
+                return self.vectorstore
+
+            if self.vectorstore is None:
+                self.load()
+
+            if self.vectorstore is not None:
+                if not self._is_fresh(self.manifest, current):
+                    logger.info("Transaction data changed - applying incremental index update")
+                    self._apply_delta(current)
+                return self.vectorstore
+
+            logger.info("Transaction index missing - building index")
+            self.vectorstore = self._build(current)
+            self._positions = None
+            self._filter_vocabulary = None
+            return self.vectorstore
+
+    def _vocabulary(self):
+        """Znane konta i pełne nazwy kontrahentów - słownik dla parsera ograniczeń."""
+        if self._filter_vocabulary is None:
+            conn = self._connect()
+            try:
+                accounts = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT account_id FROM all_transactions WHERE account_id IS NOT NULL")]
+                names = conn.execute(
+                    "SELECT creditor_name FROM all_transactions WHERE creditor_name IS NOT NULL "
+                    "UNION SELECT debtor_name FROM all_transactions WHERE debtor_name IS NOT NULL"
+                ).fetchall()
+            finally:
+                conn.close()
+            counterparties = {" ".join(WORD.findall(name.lower())) for (name,) in names}
+            self._filter_vocabulary = (accounts, {name for name in counterparties if len(name) >= 3})
+        return self._filter_vocabulary
+
+    def question_constraints(self, question):
+        """Ograniczenia z pytania (daty, znak kwoty, waluta, konto, kontrahent) wg słownika danych."""
+        accounts, counterparties = self._vocabulary()
+        return extract_constraints(question, accounts=accounts, counterparties=counterparties)
+
+    def data_version(self):
+        """
+        Odcisk danych transakcji dla cache odpowiedzi - liczony ponownie dopiero
+        po zmianie pliku bazy (mtime i rozmiar bazy oraz WAL), nie przy każdym pytaniu.
+        """
+        stamp = db_version_stamp(self.db_path)
+        cached = self._data_version
+        if cached is None or cached[1] != stamp:
+            cached = (self.data_fingerprint()["fingerprint"], stamp)
+            self._data_version = cached
+        return cached[0]
+
+    def candidate_ids(self, question):
+        """
+        Id transakcji spełniających ograniczenia wyciągnięte z pytania (daty, znak kwoty,
+        waluta, konto, kontrahent) albo None, gdy pytanie ich nie zawiera lub nic nie pasuje.
+        """
+        constraints = self.question_constraints(question)
+        if not has_constraints(constraints):
+            return None
+
+        where, params = constraints_to_sql(constraints)
+        conn = self._connect()
+        try:
+            ids = [row[0] for row in conn.execute(f"SELECT id FROM all_transactions WHERE {where}", params)]
+        finally:
+            conn.close()
+
+        logger.info(f"Metadata pre-filter {constraints} matched {len(ids)} transactions")
+        if not ids:
+            # Zbyt wąski filtr (np. zły rok) - lepiej wyszukać w całym zbiorze niż nic nie zwrócić
+            return None
+        return ids
+
+    def _position_map(self, vectorstore):
+        """{id transakcji: pozycja w FAISS} - liczona raz dla każdej wersji indeksu."""
+        positions = self._positions
+        if positions is None or positions[0] is not vectorstore:
+            positions = (vectorstore, {
+                int(doc_id[len("txn-"):]): position
+                for position, doc_id in vectorstore.index_to_docstore_id.items()
+                if doc_id.startswith("txn-")
+            })
+            self._positions = positions
+        return positions[1]
+
+    def search_among(self, query, transaction_ids, k, embedding=None, vectorstore=None):
+        """
+        Wyszukiwanie wektorowe ograniczone do podanych transakcji (przed ANN, nie po nim).
+        Gotowy embedding pytania (np. z wsadu pod-pytań) pomija wywołanie modelu.
+        vectorstore to wersja indeksu, nad którą zbudowano retriever (domyślnie bieżąca).
+        """
+        vectorstore = vectorstore or self.vectorstore
+        positions = self._position_map(vectorstore)
+        subset = np.array([positions[i] for i in transaction_ids if i in positions], dtype=np.int64)
+        if subset.size == 0:
+            return []
+
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+        query_vector = np.array([embedding], dtype=np.float32)
+        if vectorstore._normalize_L2:
+            faiss.normalize_L2(query_vector)
+
+        inner_product = vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        if subset.size <= self.exact_search_limit:
+            # Mały podzbiór: dokładne odległości tylko dla kandydatów - koszt O(podzbioru)
+            vectors = vectorstore.index.reconstruct_batch(subset)
+            if inner_product:
+                order = np.argsort(-(vectors @ query_vector[0]))
+            else:
+                order = np.argsort(((vectors - query_vector) ** 2).sum(axis=1))
+            chosen = subset[order[:k]]
+        else:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(subset))
+            _, indices = vectorstore.index.search(query_vector, k, params=params)
+            chosen = [i for i in indices[0] if i != -1]
+
+        return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)]) for i in chosen]
+
+    def as_retriever(self, k=None, vectorstore=None):
+        """
+        Retriever nad aktualnym indeksem: hybrydowy (FAISS + FTS5) albo czysto wektorowy,
+        z opcjonalnym filtrem metadanych stosowanym przed wyszukiwaniem.
+        Podany vectorstore jest używany bez sprawdzania świeżości indeksu.
+        """
+        vectorstore = vectorstore or self.get_vectorstore()
+        if vectorstore is None:
+            return None
+        config = get_ai_config()
+        k = k or config.get("rag", "max_docs", default=10)
+        return HybridRetriever(
+            vectorstore=vectorstore,
+            keyword_index=self.keyword_index,
+            k=k,
+            vector_k=config.get("rag", "vector_k", default=k) if self.keyword_index is not None else k,
+            keyword_k=config.get("rag", "keyword_k", default=k),
+            rrf_k=config.get("rag", "rrf_k", default=60),
+            prefilter=self.candidate_ids if config.get("rag", "metadata_prefilter", default=True) else None,
+            candidate_search=partial(self.search_among, vectorstore=vectorstore),
+        )
+
+    def refresh(self, full=False):
+        """
+        Odśwież indeks na żądanie. Gdy odcisk danych się zmienił, dokłada nowe
+        wiersze, usuwa skasowane i przeindeksowuje wiersze o zmienionej treści
+        (tylko z zakresów id o zmienionej sumie kontrolnej). full=True działa
+        także przy niezmienionym odcisku i porównuje treść wszystkich wierszy.
+        """
+        with self._lock:
+            if self.vectorstore is None and self.load() is None:
+                self.get_vectorstore()
+                documents = len(self.vectorstore.index_to_docstore_id) if self.vectorstore else 0
+                return {"added": documents, "updated": 0, "deleted": 0, "documents": documents}
+
+            current = self.data_fingerprint()
+            if not full and self._is_fresh(self.manifest, current):
+                documents = len(self.vectorstore.index_to_docstore_id)
+                return {"added": 0, "updated": 0, "deleted": 0, "documents": documents}
+            return self._apply_delta(current, full=full)
+
+
+# Globalny instance
+_index_store = None
+_index_store_lock = threading.Lock()
+
+
+def get_index_store():
+    """Pobierz globalny magazyn indeksu transakcji."""
+    global _index_store
+    with _index_store_lock:
+        if _index_store is None:
+            db_path = resolve_transactions_db_path()
+            if not db_path or not os.path.exists(db_path):
+                raise FileNotFoundError(f"Database file not found: {db_path}")
+            _index_store = TransactionIndexStore(db_path)
+        return _index_store
+
+
+_refresh_thread = None
+
+
+def start_refresh_scheduler(interval=None):
+    """Uruchom wątek odświeżający indeks co rag.refresh_interval sekund (0 = wyłączone)."""
+    global _refresh_thread
+    if interval is None:
+        interval = get_ai_config().get("rag", "refresh_interval", default=0)
+    if not interval or interval <= 0 or _refresh_thread is not None:
+        return None
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            try:
+                store = get_index_store()
+                if store.vectorstore is not None:
+                    store.refresh()
+            except Exception as e:
+                logger.error(f"Scheduled index refresh failed: {str(e)}")
+
+    _refresh_thread = threading.Thread(target=_run, name="index-refresh", daemon=True)
+    _refresh_thread.start()
+    logger.info(f"Transaction index refresh scheduled every {interval}s")
+    return _refresh_thread
@@ -0,0 +1,120 @@
+import os
+import sys
+import re
+import sqlite3
+import threading
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from config.logging import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class KeywordIndex:
+    """
+    Indeks pełnotekstowy SQLite FTS5 nad treścią dokumentów transakcji.
+
+    Dokładne tokeny (BLIK, nazwy sklepów, numery IBAN) są słabo reprezentowane
+    w embeddingach - tu trafiają w BM25 w mikrosekundach. Indeks jest
+    utrzymywany razem z indeksem wektorowym (te same id dokumentów).
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+            "doc_id UNINDEXED, content, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM transactions_fts").fetchone()[0]
+
+    def add(self, documents):
+        """Dodaj lub nadpisz dokumenty podane jako pary (id dokumentu, Document)."""
+        if not documents:
+            return
+        conn = self._connection()
+        self._insert(conn, documents)
+        conn.commit()
+
+    def delete(self, transaction_ids):
+        """Usuń dokumenty po id transakcji (rowid tabeli FTS)."""
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return
+        conn = self._connection()
+        for i in range(0, len(transaction_ids), 500):
+            chunk = transaction_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM transactions_fts WHERE rowid IN ({placeholders})", chunk)
+        conn.commit()
+
+    def rebuild(self, documents):
+        """Zbuduj indeks od nowa z iterowalnej kolekcji par (id dokumentu, Document)."""
+        conn = self._connection()
+        conn.execute("DELETE FROM transactions_fts")
+        batch = []
+        for item in documents:
+            batch.append(item)
+            if len(batch) >= 1000:
+                self._insert(conn, batch)
+                batch = []
+        self._insert(conn, batch)
+        conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')")
+        conn.commit()
+
+    @staticmethod
+    def _insert(conn, documents):
+        # rowid = id transakcji, dzięki temu nadpisanie i usuwanie nie skanują tabeli
+        if documents:
+            conn.executemany(
+                "INSERT OR REPLACE INTO transactions_fts (rowid, doc_id, content) VALUES (?, ?, ?)",
+                [(doc.metadata["id"], doc_id, doc.page_content) for doc_id, doc in documents],
+            )
+
+    @staticmethod
+    def _match_expression(query):
+        # Każdy token w cudzysłowie - znaki specjalne FTS5 w pytaniu nie psują składni
+        tokens = TOKEN_PATTERN.findall(query)
+        return " OR ".join(f'"{token}"' for token in tokens)
+
+    def search(self, query, k=10, allowed_ids=None):
+        """
+        Zwróć listę (id dokumentu, wynik bm25) posortowaną od najlepszego dopasowania.
+
+        allowed_ids (zbiór id transakcji) zawęża wyniki do kandydatów z filtra metadanych.
+        """
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        limit = k if allowed_ids is None else k * 20
+        try:
+            rows = self._connection().execute(
+                "SELECT rowid, doc_id, bm25(transactions_fts) AS score FROM transactions_fts "
+                "WHERE transactions_fts MATCH ? ORDER BY score LIMIT ?",
+                (expression, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Keyword search failed for '{query[:50]}': {str(e)}")
+            return []
+        if allowed_ids is not None:
+            rows = [row for row in rows if row[0] in allowed_ids]
+        return [(doc_id, score) for _, doc_id, score in rows[:k]]
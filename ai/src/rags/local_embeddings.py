@@ -0,0 +1,56 @@
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Lokalne, deterministyczne embeddingi (hashowane słowa i n-gramy znakowe).
+
+    Nie wymagają sieci ani klucza API - pozwalają budować i testować indeks RAG
+    na odciętej maszynie z prędkością CPU. Ten sam tekst zawsze daje ten sam wektor.
+    """
+
+    def __init__(self, dimensions=512, ngram_range=(3, 4)):
+        self.dimensions = int(dimensions)
+        self.ngram_range = ngram_range
+
+    @property
+    def model_name(self):
+        return f"local-hashing-{self.dimensions}"
+
+    def _features(self, text):
+        text = text.lower()
+        tokens = TOKEN_PATTERN.findall(text)
+        features = list(tokens)
+        min_n, max_n = self.ngram_range
+        for token in tokens:
+            padded = f"#{token}#"
+            for n in range(min_n, max_n + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 jest stabilny między procesami (w przeciwieństwie do hash())
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dimensions] += sign
+
+        # Sublinearne tf + normalizacja L2, żeby długie opisy nie dominowały
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text).tolist()
@@ -0,0 +1,204 @@
+import re
+import calendar
+from datetime import date, timedelta
+
+# Nazwy miesięcy (PL z odmianą + EN) -> numer miesiąca
+MONTH_PATTERNS = [
+    (1, r"stycze[nń]|stycznia|styczniu|january"),
+    (2, r"luty|lutego|lutym|february"),
+    (3, r"marzec|marca|marcu|march"),
+    (4, r"kwiecie[nń]|kwietnia|kwietniu|april"),
+    (5, r"maj|maja|maju|(?<=in )may|(?<=of )may"),
+    (6, r"czerwiec|czerwca|czerwcu|june"),
+    (7, r"lipiec|lipca|lipcu|july"),
+    (8, r"sierpie[nń]|sierpnia|sierpniu|august"),
+    (9, r"wrzesie[nń]|wrze[sś]nia|wrze[sś]niu|september"),
+    (10, r"pa[zź]dziernik|pa[zź]dziernika|pa[zź]dzierniku|october"),
+    (11, r"listopad|listopada|listopadzie|november"),
+    (12, r"grudzie[nń]|grudnia|grudniu|december"),
+]
+
+# Skróty miesięcy ("jan", "mar", "dec") kolidują ze zwykłymi słowami i imionami (Jan) -
+# liczą się tylko jako osobne słowa stojące przy dniu lub roku, np. "5 mar", "jan 2025"
+MONTH_ABBREVIATIONS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7,
+    "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+MONTH_ABBREVIATION = re.compile(
+    r"(?:\b\d{1,4}\s+)\b(" + "|".join(MONTH_ABBREVIATIONS) + r")\b\.?"
+    r"|\b(" + "|".join(MONTH_ABBREVIATIONS) + r")\b\.?(?=\s+\d{1,4}\b)"
+)
+
+EXPENSE_PATTERN = re.compile(
+    r"\b(spen[dt]|spending|expenses?|paid|pay|bought|purchases?|cost|"
+    r"wyda[łlćc]\w*|wydatk\w*|zap[łl]aci\w*|kupi[łl]\w*|zakup\w*|p[łl]atno[sś]\w*)\b"
+)
+INCOME_PATTERN = re.compile(
+    r"\b(income|earn\w*|received|salary|revenue|"
+    r"przych[oó]d\w*|wp[łl]yw\w*|zarobi\w*|zarobk\w*|otrzyma[łl]\w*|wyp[łl]at\w*|pensj\w*)\b"
+)
+
+CURRENCY_PATTERNS = [
+    ("PLN", r"\bpln\b|\bz[łl]\b|z[łl]otych|z[łl]ote"),
+    ("EUR", r"\beur\b|\beuro\b|€"),
+    ("USD", r"\busd\b|dolar\w*|dollars?|\$"),
+    ("GBP", r"\bgbp\b|funt\w*|pounds?|£"),
+    ("CHF", r"\bchf\b|frank\w*|francs?"),
+]
+
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+YEAR = re.compile(r"\b(20\d{2})\b")
+
+LAST_MONTH = re.compile(r"\b(last month|previous month|zesz[łl]ym miesi[aą]cu|poprzednim miesi[aą]cu|ostatni miesi[aą]c)\b")
+THIS_MONTH = re.compile(r"\b(this month|current month|tym miesi[aą]cu|bie[żz][aą]cym miesi[aą]cu)\b")
+LAST_DAYS = re.compile(r"\b(?:last|ostatni\w*)\s+(\d{1,3})\s+(?:days|dni)\b")
+LAST_YEAR = re.compile(r"\b(last year|previous year|zesz[łl]ym roku|poprzednim roku)\b")
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _iso_dates(text):
+    dates = []
+    for y, m, d in ISO_DATE.findall(text):
+        try:
+            dates.append(date(int(y), int(m), int(d)))
+        except ValueError:
+            continue  # np. 2025-02-30 - nie jest datą, pomijamy jak inne nierozpoznane fragmenty
+    return dates
+
+
+def _extract_dates(text, today):
+    iso_dates = _iso_dates(text)
+    if len(iso_dates) >= 2:
+        return min(iso_dates), max(iso_dates)
+    if len(iso_dates) == 1:
+        return iso_dates[0], iso_dates[0]
+
+    match = LAST_DAYS.search(text)
+    if match:
+        return today - timedelta(days=int(match.group(1))), today
+    if LAST_MONTH.search(text):
+        first_this_month = today.replace(day=1)
+        previous = first_this_month - timedelta(days=1)
+        return _month_range(previous.year, previous.month)
+    if THIS_MONTH.search(text):
+        return today.replace(day=1), today
+    if LAST_YEAR.search(text):
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+
+    text_without_years = YEAR.sub(" ", text)
+    months = {
+        month for month, pattern in MONTH_PATTERNS
+        if re.search(rf"\b(?:{pattern})\b", text_without_years)
+    }
+    months.update(MONTH_ABBREVIATIONS[before or after]
+                  for before, after in MONTH_ABBREVIATION.findall(text))
+    months = sorted(months)
+    years = sorted({int(y) for y in YEAR.findall(text)})
+
+    if months:
+        if years:
+            year = years[-1]
+        else:
+            # Bez roku: najbliższe wystąpienie miesiąca, które już minęło lub trwa
+            year = today.year if months[0] <= today.month else today.year - 1
+        start, _ = _month_range(year, months[0])
+        _, end = _month_range(year, months[-1])
+        return start, end
+    if years:
+        return date(years[0], 1, 1), date(years[-1], 12, 31)
+    return None, None
+
+
+def extract_constraints(question, today=None, accounts=(), counterparties=()):
+    """
+    Wyciągnij z pytania ograniczenia strukturalne bez użycia LLM.
+
+    Zwraca słownik z kluczami date_from, date_to (ISO), sign ('expense'/'income'),
+    currency, account_id i counterparties (lista nazw kontrahentów).
+    Nieznalezione ograniczenia mają wartość None / pustą listę.
+
+    Kontrahent (pełna nazwa, małymi literami) pasuje, gdy pytanie zawiera całą
+    nazwę jako frazę albo - dla nazw wielowyrazowych - co najmniej dwa jej słowa;
+    pojedyncze słowo z nazwy nie wystarcza, żeby nie zawężać wyników przypadkiem.
+    """
+    today = today or date.today()
+    text = (question or "").lower()
+
+    date_from, date_to = _extract_dates(text, today)
+
+    sign = None
+    is_expense = bool(EXPENSE_PATTERN.search(text))
+    is_income = bool(INCOME_PATTERN.search(text))
+    if is_expense != is_income:
+        sign = "expense" if is_expense else "income"
+
+    currency = None
+    for code, pattern in CURRENCY_PATTERNS:
+        if re.search(pattern, text):
+            currency = code
+            break
+
+    words = set(WORD.findall(text))
+    account_id = next((account for account in accounts if account and account.lower() in words), None)
+    matched_counterparties = sorted(name for name in counterparties if _mentions_counterparty(text, words, name))
+
+    return {
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "sign": sign,
+        "currency": currency,
+        "account_id": account_id,
+        "counterparties": matched_counterparties,
+    }
+
+
+def _mentions_counterparty(text, words, name):
+    tokens = [token for token in WORD.findall(name) if len(token) >= 3 and not token.isdigit()]
+    if not tokens:
+        return False
+    if re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text):
+        return True
+    return len(tokens) >= 2 and sum(token in words for token in set(tokens)) >= 2
+
+
+def has_constraints(constraints):
+    return any(constraints.get(key) for key in ("date_from", "date_to", "sign", "currency",
+                                                "account_id", "counterparties"))
+
+
+def constraints_to_sql(constraints):
+    """Zamień ograniczenia na klauzulę WHERE (bez słowa WHERE) i listę parametrów."""
+    clauses = []
+    params = []
+    if constraints.get("date_from"):
+        clauses.append("booking_date >= ?")
+        params.append(constraints["date_from"])
+    if constraints.get("date_to"):
+        clauses.append("booking_date <= ?")
+        params.append(constraints["date_to"])
+    if constraints.get("sign") == "expense":
+        clauses.append("amount < 0")
+    elif constraints.get("sign") == "income":
+        clauses.append("amount > 0")
+    if constraints.get("currency"):
+        clauses.append("currency = ?")
+        params.append(constraints["currency"])
+    if constraints.get("account_id"):
+        clauses.append("account_id = ?")
+        params.append(constraints["account_id"])
+    counterparties = constraints.get("counterparties") or []
+    if counterparties:
+        parts = []
+        for name in counterparties:
+            # Nazwa ze słownika to same słowa - interpunkcja w bazie ("s.a.") nie blokuje dopasowania
+            like = "%" + name.replace(" ", "%") + "%"
+            parts.append("(LOWER(creditor_name) LIKE ? OR LOWER(debtor_name) LIKE ? "
+                         "OR LOWER(remittance_info_unstructured) LIKE ?)")
+            params.extend([like, like, like])
+        clauses.append("(" + " OR ".join(parts) + ")")
+    return " AND ".join(clauses), params
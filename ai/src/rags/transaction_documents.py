@@ -0,0 +1,76 @@
+import os
+import sys
+import hashlib
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from langchain_core.documents import Document
+
+# Kolumny z ALL_TRANSACTIONS_TABLE_STRUCTURE renderowane do treści dokumentu (kolumna, etykieta)
+DOCUMENT_COLUMNS = [
+    ("booking_date", "Date"),
+    ("amount", "Amount"),
+    ("currency", "Currency"),
+    ("remittance_info_unstructured", "Description"),
+    ("creditor_name", "Creditor"),
+    ("creditor_iban", "Creditor IBAN"),
+    ("debtor_name", "Debtor"),
+    ("debtor_iban", "Debtor IBAN"),
+    ("account_id", "Account"),
+    ("balance_after_amount", "Balance after"),
+]
+
+# Kolumny kopiowane do metadanych dokumentu
+METADATA_COLUMNS = [
+    "id",
+    "booking_date",
+    "amount",
+    "currency",
+    "creditor_name",
+    "debtor_name",
+    "account_id",
+]
+
+
+def transaction_doc_id(transaction_id):
+    """Identyfikator dokumentu w docstore dla wiersza all_transactions."""
+    return f"txn-{transaction_id}"
+
+
+def render_transaction(row):
+    """Zamień wiersz transakcji (mapowanie kolumna -> wartość) na czytelny tekst."""
+    amount = row.get("amount")
+    if amount is not None:
+        kind = "expense" if amount < 0 else "income"
+        lines = [f"Type: {kind}"]
+    else:
+        lines = []
+
+    for column, label in DOCUMENT_COLUMNS:
+        value = row.get(column)
+        if value is None or value == "":
+            continue
+        lines.append(f"{label}: {value}")
+    return "\n".join(lines)
+
+
+def build_transaction_document(row):
+    """Zbuduj Document dla pojedynczej transakcji."""
+    row = dict(row)
+    page_content = render_transaction(row)
+    metadata = {column: row.get(column) for column in METADATA_COLUMNS}
+    # Skrót treści pozwala wykryć zmienione wiersze przy odświeżaniu indeksu
+    metadata["content_hash"] = hashlib.sha1(page_content.encode("utf-8")).hexdigest()
+    return Document(page_content=page_content, metadata=metadata)
+
+
+def build_transaction_documents(rows):
+    """Zbuduj listę (id dokumentu, Document) - jeden dokument na transakcję."""
+    documents = []
+    for row in rows:
+        doc = build_transaction_document(row)
+        documents.append((transaction_doc_id(doc.metadata["id"]), doc))
+    return documents
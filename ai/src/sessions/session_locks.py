@@ -0,0 +1,122 @@
+import os
+import sys
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+
+class SessionBusyError(Exception):
+    """Sesja jest zajęta przez inne żądanie dłużej niż session.lock_timeout."""
+
+
+class SessionLocks:
+    """
+    Blokady per sesja: równoległe żądania tej samej sesji wykonują się po kolei
+    (odczyt stanu -> graf -> zapis), a różne sesje nie blokują się nawzajem.
+    Blokada znika z rejestru, gdy nikt jej nie trzyma ani na nią nie czeka.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.contended = 0
+        self.timeouts = 0
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        return cls(timeout=get_ai_config().get("session", "lock_timeout", default=120))
+
+    def _enter(self, session_id):
+        with self._lock:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry
+
+    def _leave(self, session_id, entry):
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    @contextmanager
+    def hold(self, session_id):
+        entry = self._enter(session_id)
+        lock = entry[0]
+        try:
+            if not lock.acquire(blocking=False):
+                with self._lock:
+                    self.contended += 1
+                logger.info(f"Session {session_id} busy - waiting for the previous request")
+                if not lock.acquire(timeout=self.timeout if self.timeout else -1):
+                    with self._lock:
+                        self.timeouts += 1
+                    raise SessionBusyError(f"Session {session_id} is busy")
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._leave(session_id, entry)
+
+    @asynccontextmanager
+    async def ahold(self, session_id):
+        """
+        Wersja dla pętli zdarzeń: bez rywalizacji blokada jest brana od razu,
+        a oczekiwanie na zajętą sesję odbywa się w wątku, nie blokując pętli.
+        """
+        entry = self._enter(session_id)
+        lock = entry[0]
+        leave = True
+        try:
+            if not lock.acquire(blocking=False):
+                with self._lock:
+                    self.contended += 1
+                logger.info(f"Session {session_id} busy - waiting for the previous request")
+                waiter = asyncio.ensure_future(
+                    asyncio.to_thread(lock.acquire, True, self.timeout if self.timeout else -1)
+                )
+                try:
+                    acquired = await asyncio.shield(waiter)
+                except asyncio.CancelledError:
+                    # Żądanie anulowane, ale wątek nadal czeka na blokadę - wpis zostaje w rejestrze
+                    # do jego zakończenia, żeby kolejne żądania nie dostały nowej blokady obok starej
+                    def abandon(done):
+                        try:
+                            if not done.cancelled() and done.exception() is None and done.result():
+                                lock.release()
+                        finally:
+                            self._leave(session_id, entry)
+
+                    leave = False
+                    waiter.add_done_callback(abandon)
+                    raise
+                if not acquired:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise SessionBusyError(f"Session {session_id} is busy")
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            if leave:
+                self._leave(session_id, entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._locks),
+                "contended": self.contended,
+                "timeouts": self.timeouts,
+            }
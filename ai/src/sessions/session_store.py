@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+# Użyj lokalnego systemu AI
+ai_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ai_root not in sys.path:
+    sys.path.insert(0, ai_root)
+
+from config.logging import get_logger
+from config.config_manager import get_ai_config
+
+logger = get_logger(__name__)
+
+
+def estimate_size(obj, seen=None, depth=0, max_depth=6):
+    """
+    Przybliżony rozmiar obiektu w bajtach. Obiekty współdzielone (np. wspólny indeks
+    FAISS) liczone są raz dzięki zbiorowi seen przekazywanemu między sesjami.
+    """
+    if seen is None:
+        seen = set()
+    if obj is None or id(obj) in seen or depth > max_depth:
+        return 0
+    seen.add(id(obj))
+
+    # Indeks FAISS: wektory float32 poza stertą Pythona
+    if hasattr(obj, "ntotal") and hasattr(obj, "d"):
+        try:
+            return int(obj.ntotal) * int(obj.d) * 4
+        except Exception:
+            return 0
+
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(estimate_size(k, seen, depth + 1) + estimate_size(v, seen, depth + 1)
+                          for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, seen, depth + 1) for item in obj)
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += estimate_size(attributes, seen, depth + 1)
+    return size
+
+
+class SessionStore:
+    """
+    Ograniczony magazyn stanów sesji czatu trzymany w pamięci procesu.
+
+    Egzekwuje session.timeout (TTL od ostatniego użycia), session.max_sessions
+    (LRU - najdawniej używana sesja wypada pierwsza) i co session.cleanup_interval
+    sekund usuwa wygasłe sesje w wątku w tle.
+    """
+
+    def __init__(self, timeout=3600, max_sessions=100, cleanup_interval=300):
+        self.timeout = timeout
+        self.max_sessions = max(1, int(max_sessions))
+        self.cleanup_interval = cleanup_interval
+        self.evicted = 0
+        self.expired = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self._sweeper = None
+
+    @classmethod
+    def from_config(cls):
+        config = get_ai_config()
+        return cls(
+            timeout=config.get("session", "timeout", default=3600),
+            max_sessions=config.get("session", "max_sessions", default=100),
+            cleanup_interval=config.get("session", "cleanup_interval", default=300),
+        )
+
+    def _is_expired(self, last_used, now):
+        return bool(self.timeout) and now - last_used > self.timeout
+
+    def get(self, session_id, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return default
+            state, last_used = entry
+            if self._is_expired(last_used, now):
+                del self._sessions[session_id]
+                self.expired += 1
+                logger.info(f"Session {session_id} expired")
+                return default
+            self._sessions[session_id] = (state, now)
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def set(self, session_id, state):
+        with self._lock:
+            self._sessions[session_id] = (state, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self.evicted += 1
+                logger.info(f"Session {evicted_id} evicted (max_sessions={self.max_sessions})")
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def sweep(self):
+        """Usuń wygasłe sesje. Zwraca liczbę usuniętych."""
+        now = time.monotonic()
+        with self._lock:
+            expired_ids = [session_id for session_id, (_, last_used) in self._sessions.items()
+                           if self._is_expired(last_used, now)]
+            for session_id in expired_ids:
+                del self._sessions[session_id]
+            self.expired += len(expired_ids)
+        if expired_ids:
+            logger.info(f"Session sweeper removed {len(expired_ids)} expired sessions")
+        return len(expired_ids)
+
+    def start_sweeper(self):
+        if self._sweeper is not None or not self.cleanup_interval or self.cleanup_interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.cleanup_interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Session sweeper failed: {str(e)}")
+
+        self._sweeper = threading.Thread(target=_run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._lock:
+            states = [state for state, _ in self._sessions.values()]
+            sessions = len(states)
+        seen = set()
+        retained = sum(estimate_size(state, seen) for state in states)
+        return {
+            "backend": "memory",
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "timeout": self.timeout,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "estimated_bytes": retained,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Magazyn sesji w pliku SQLite współdzielonym przez wszystkie procesy serwisu.
+
+    Przechowuje tylko serializowalną część stanu (JSON), więc każdy worker może
+    obsłużyć każdą sesję. TTL i limit sesji działają jak w SessionStore, ale czas
+    ostatniego użycia jest zegarem ściennym, wspólnym dla procesów.
+    """
+
+    def __init__(self, path, timeout=3600, max_sessions=100, cleanup_interval=300):
+        super().__init__(timeout=timeout, max_sessions=max_sessions, cleanup_interval=cleanup_interval)
+        self.path = str(path)
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_used ON sessions (last_used)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id, default=None):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT state, last_used FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return default
+            state, last_used = row
+            if self._is_expired(last_used, now):
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self.expired += 1
+                logger.info(f"Session {session_id} expired")
+                return default
+            conn.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(state)
+
+    def set(self, session_id, state):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, last_used) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False), time.time()),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN "
+                    "(SELECT session_id FROM sessions ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evicted += overflow
+                logger.info(f"{overflow} sessions evicted (max_sessions={self.max_sessions})")
+
+    def delete(self, session_id):
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions")
+
+    def __contains__(self, session_id):
+        row = self._connection().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def sweep(self):
+        """Usuń wygasłe sesje. Zwraca liczbę usuniętych."""
+        if not self.timeout:
+            return 0
+        conn = self._connection()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM sessions WHERE last_used < ?", (time.time() - self.timeout,)
+            ).rowcount
+        self.expired += removed
+        if removed:
+            logger.info(f"Session sweeper removed {removed} expired sessions")
+        return removed
+
+    def stats(self):
+        sessions, retained = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM sessions"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "timeout": self.timeout,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "estimated_bytes": retained,
+        }
+
+
+def create_session_store():
+    """
+    Utwórz magazyn sesji wg session.backend: "memory" (domyślnie, jeden proces)
+    albo "sqlite" (session.sqlite_path, współdzielony przez wiele workerów).
+    """
+    config = get_ai_config()
+    backend = config.get("session", "backend", default="memory")
+    if backend == "sqlite":
+        path = (config.get("session", "sqlite_path", default=None)
+                or Path(ai_root) / "data" / "sessions.db")
+        store = SQLiteSessionStore(
+            path,
+            timeout=config.get("session", "timeout", default=3600),
+            max_sessions=config.get("session", "max_sessions", default=100),
+            cleanup_interval=config.get("session", "cleanup_interval", default=300),
+        )
+        logger.info(f"Session state persisted in SQLite: {store.path}")
+        return store
+    if backend != "memory":
+        logger.warning(f"Unknown session backend '{backend}', using in-memory store")
+    return SessionStore.from_config()
@@ -0,0 +1,27 @@
+import re
+import unicodedata
+
+DATE_PATTERN = re.compile(r"\b\d{4}[-./]\d{1,2}[-./]\d{1,2}\b|\b\d{1,2}[-./]\d{1,2}[-./]\d{2,4}\b")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+PUNCTUATION_PATTERN = re.compile(r"[^\w<>\s]", re.UNICODE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """
+    Postać kanoniczna pytania do kluczy cache: małe litery, bez interpunkcji
+    i nadmiarowych spacji, daty -> <date>, liczby -> <num>.
+    """
+    text = unicodedata.normalize("NFKC", question or "").lower()
+    text = DATE_PATTERN.sub(" <date> ", text)
+    text = NUMBER_PATTERN.sub(" <num> ", text)
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def question_literals(question):
+    """Daty i liczby z pytania - to, co normalize_question zastępuje znacznikami."""
+    text = unicodedata.normalize("NFKC", question or "")
+    dates = DATE_PATTERN.findall(text)
+    numbers = NUMBER_PATTERN.findall(DATE_PATTERN.sub(" ", text))
+    return tuple(dates + numbers)
@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from src.agents.aggregate_store import TransactionAggregateStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "transactions.db"
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE all_transactions (id INTEGER PRIMARY KEY, account_id TEXT, booking_date TEXT, "
+                     "booking_date_time TEXT, amount REAL, currency TEXT, creditor_name TEXT, debtor_name TEXT)")
+        conn.executemany(
+            "INSERT INTO all_transactions (account_id, booking_date, amount, currency, creditor_name) "
+            "VALUES ('acc1', ?, ?, 'PLN', ?)",
+            [("2025-01-05", -10.0, "Lidl"), ("2025-01-06", -20.0, "Biedronka"), ("2025-02-01", -5.0, "Lidl")],
+        )
+    conn.close()
+    return path
+
+
+def _monthly(store):
+    conn = sqlite3.connect(store.path)
+    try:
+        return conn.execute("SELECT month, counterparty, total FROM monthly_totals ORDER BY 1, 2").fetchall()
+    finally:
+        conn.close()
+
+
+def _update(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(sql)
+    conn.close()
+
+
+def test_new_rows_are_added_without_rebuild(db_path, tmp_path):
+    store = TransactionAggregateStore(str(db_path), tmp_path / "agg.db")
+    assert store.refresh()["rebuilt"]
+    _update(db_path, "INSERT INTO all_transactions (account_id, booking_date, amount, currency, creditor_name) "
+                     "VALUES ('acc1', '2025-02-03', -1.0, 'PLN', 'Lidl')")
+    assert store.refresh() == {"added": 1, "rebuilt": False}
+    assert ("2025-02", "Lidl", -6.0) in _monthly(store)
+
+
+def test_edit_of_date_or_counterparty_rebuilds(db_path, tmp_path):
+    store = TransactionAggregateStore(str(db_path), tmp_path / "agg.db")
+    store.refresh()
+    # Ta sama liczba wierszy i suma kwot - zmienia się tylko miesiąc i kontrahent
+    _update(db_path, "UPDATE all_transactions SET booking_date = '2025-02-10', creditor_name = 'Zabka' WHERE id = 1")
+    assert store.refresh()["rebuilt"]
+    assert _monthly(store) == [("2025-01", "Biedronka", -20.0), ("2025-02", "Lidl", -5.0),
+                               ("2025-02", "Zabka", -10.0)]
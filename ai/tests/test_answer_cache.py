@@ -0,0 +1,53 @@
+from src.rags.answer_cache import SemanticAnswerCache
+
+VECTORS = {
+    "ile wydałem w maju?": [1.0, 0.0, 0.0],
+    "how much did I spend in May": [0.96, 0.28, 0.0],
+    "how much did I earn in May": [0.8, 0.6, 0.0],
+    "show my last 10 transactions": [0.0, 0.0, 1.0],
+    "show my last 20 transactions": [0.0, 0.1, 0.99],
+}
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+MAY = {"date_from": "2025-05-01", "date_to": "2025-05-31", "sign": "expense", "counterparties": []}
+
+
+def test_paraphrase_above_threshold_hits():
+    cache = SemanticAnswerCache(FakeEmbeddings())
+    cache.store("ile wydałem w maju?", "agent", "500 PLN", "v1", MAY)
+    answer, route, similarity = cache.lookup("how much did I spend in May", "v1", MAY)
+    assert (answer, route) == ("500 PLN", "agent")
+    assert similarity >= cache.threshold
+
+
+def test_loosely_similar_question_misses_with_default_threshold():
+    cache = SemanticAnswerCache(FakeEmbeddings())
+    cache.store("ile wydałem w maju?", "agent", "500 PLN", "v1", MAY)
+    assert cache.lookup("how much did I earn in May", "v1", MAY) is None
+
+
+def test_different_constraints_or_data_version_miss():
+    cache = SemanticAnswerCache(FakeEmbeddings())
+    cache.store("ile wydałem w maju?", "agent", "500 PLN", "v1", MAY)
+    assert cache.lookup("how much did I spend in May", "v1", dict(MAY, counterparties=["biedronka"])) is None
+    assert cache.lookup("how much did I spend in May", "v1", dict(MAY, date_from="2024-05-01")) is None
+    assert cache.lookup("how much did I spend in May", "v2", MAY) is None
+
+
+def test_questions_differing_only_in_a_number_miss():
+    cache = SemanticAnswerCache(FakeEmbeddings())
+    cache.store("show my last 10 transactions", "agent", "10 rows", "v1", {})
+    assert cache.lookup("show my last 20 transactions", "v1", {}) is None
+    assert cache.lookup("show my last 10 transactions", "v1", {})[0] == "10 rows"
+
+
+def test_lookup_can_be_limited_to_a_route():
+    cache = SemanticAnswerCache(FakeEmbeddings())
+    cache.store("ile wydałem w maju?", "rag", "500 PLN", "v1", MAY)
+    assert cache.lookup("how much did I spend in May", "v1", MAY, route="agent") is None
+    assert cache.lookup("how much did I spend in May", "v1", MAY, route="rag")[0] == "500 PLN"
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from src.agents import llm_pool
+
+
+@pytest.fixture
+def openai_client():
+    llm_pool.clear_llm_pool()
+    llm = llm_pool.get_llm("openai", "gpt-4o-mini", 0, "test-key")
+    yield llm
+    llm_pool.clear_llm_pool()
+
+
+def test_clear_llm_pool_closes_http_clients(openai_client):
+    llm_pool.clear_llm_pool()
+
+    assert openai_client.http_client.is_closed
+    assert openai_client.http_async_client.is_closed
+    assert llm_pool.llm_pool_stats()["clients"] == 0
+
+
+def test_clear_llm_pool_inside_event_loop_schedules_async_close(openai_client):
+    async def clear():
+        llm_pool.clear_llm_pool()
+        await asyncio.sleep(0)
+
+    asyncio.run(clear())
+
+    assert openai_client.http_client.is_closed
+    assert openai_client.http_async_client.is_closed
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from src.agents.query_cost import QueryCostEstimator
+
+
+@pytest.fixture
+def estimator(tmp_path):
+    db_path = tmp_path / "transactions.db"
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("CREATE TABLE all_transactions (id INTEGER PRIMARY KEY, booking_date TEXT, "
+                     "amount REAL, creditor_name TEXT)")
+        conn.execute("CREATE INDEX idx_booking_date ON all_transactions (booking_date)")
+        conn.executemany("INSERT INTO all_transactions (booking_date, amount, creditor_name) VALUES (?, ?, ?)",
+                         [(f"2025-01-{day % 28 + 1:02d}", -day, f"shop {day % 7}") for day in range(1000)])
+    conn.close()
+    return QueryCostEstimator(str(db_path), max_result_rows=200, max_scan_rows=100000)
+
+
+def test_constant_select_has_no_table(estimator):
+    cost = estimator.estimate("SELECT 1")
+    assert cost["plan"] == ["SCAN CONSTANT ROW"]
+    assert cost["rows_scanned"] == 0
+    assert cost["result_rows"] == 1
+    assert not cost["heavy"]
+
+
+def test_cte_rows_come_from_its_children(estimator):
+    cost = estimator.estimate(
+        "WITH m AS (SELECT creditor_name, SUM(amount) AS total FROM all_transactions GROUP BY creditor_name) "
+        "SELECT * FROM m ORDER BY total LIMIT 5"
+    )
+    assert cost["full_scans"] == ["all_transactions"]
+    assert cost["rows_scanned"] >= 1000
+    assert cost["result_rows"] == 5
+    assert not cost["heavy"]
+
+
+def test_materialized_cte_without_limit_is_heavy(estimator):
+    cost = estimator.estimate(
+        "WITH m AS MATERIALIZED (SELECT * FROM all_transactions) SELECT * FROM m"
+    )
+    assert cost["full_scans"] == ["all_transactions"]
+    assert cost["result_rows"] == 1000
+    assert cost["heavy"]
+
+
+def test_from_subquery_is_not_looked_up_as_table(estimator):
+    cost = estimator.estimate(
+        "SELECT x.creditor_name FROM (SELECT creditor_name, COUNT(*) AS n FROM all_transactions "
+        "GROUP BY creditor_name) AS x WHERE x.n > 10"
+    )
+    assert cost["full_scans"] == ["all_transactions"]
+    assert cost["result_rows"] is None
+
+
+def test_scalar_subquery_counts_as_scanned_not_returned(estimator):
+    cost = estimator.estimate(
+        "SELECT COUNT(*) FROM all_transactions "
+        "WHERE amount < (SELECT AVG(amount) FROM all_transactions)"
+    )
+    assert cost["rows_scanned"] == 2000
+    assert cost["result_rows"] == 1
+    assert not cost["heavy"]
+
+
+def test_index_search_on_real_table(estimator):
+    cost = estimator.estimate("SELECT * FROM all_transactions WHERE booking_date = '2025-01-05'")
+    assert cost["uses_index"]
+    assert cost["full_scans"] == []
+
+
+def test_invalid_sql_raises(estimator):
+    with pytest.raises(sqlite3.Error):
+        estimator.estimate("SELECT * FROM missing_table")
+    assert estimator.stats()["failures"] == 1
@@ -0,0 +1,50 @@
+from datetime import date
+
+from src.rags.query_filters import extract_constraints, constraints_to_sql
+
+TODAY = date(2025, 6, 15)
+COUNTERPARTIES = {"biedronka", "jan kowalski", "orange polska sa"}
+
+
+def test_invalid_iso_date_is_skipped():
+    constraints = extract_constraints("wydatki 2025-02-30", today=TODAY)
+    assert constraints["date_from"] == "2025-01-01"
+    assert constraints["date_to"] == "2025-12-31"
+    assert constraints["sign"] == "expense"
+
+
+def test_valid_iso_dates_survive_invalid_one():
+    constraints = extract_constraints("from 2025-02-30 to 2025-03-10 since 2025-03-01", today=TODAY)
+    assert constraints["date_from"] == "2025-03-01"
+    assert constraints["date_to"] == "2025-03-10"
+
+
+def test_month_abbreviation_requires_day_or_year():
+    constraints = extract_constraints("how much did I pay in the market for decor?", today=TODAY)
+    assert constraints["date_from"] is None
+    constraints = extract_constraints("expenses 5 mar 2025", today=TODAY)
+    assert (constraints["date_from"], constraints["date_to"]) == ("2025-03-01", "2025-03-31")
+
+
+def test_first_name_is_not_a_month():
+    constraints = extract_constraints("ile zapłacił mi Jan Kowalski?", today=TODAY, counterparties=COUNTERPARTIES)
+    assert constraints["date_from"] is None
+    assert constraints["counterparties"] == ["jan kowalski"]
+
+
+def test_single_token_of_counterparty_name_does_not_filter():
+    constraints = extract_constraints("payments to orange juice shop", today=TODAY, counterparties=COUNTERPARTIES)
+    assert constraints["counterparties"] == []
+
+
+def test_counterparty_matches_full_name_or_two_tokens():
+    assert extract_constraints("zakupy w biedronka", today=TODAY,
+                               counterparties=COUNTERPARTIES)["counterparties"] == ["biedronka"]
+    assert extract_constraints("rachunki orange polska", today=TODAY,
+                               counterparties=COUNTERPARTIES)["counterparties"] == ["orange polska sa"]
+
+
+def test_counterparty_filter_uses_full_name():
+    clause, params = constraints_to_sql({"counterparties": ["jan kowalski"]})
+    assert "creditor_name" in clause
+    assert params == ["%jan%kowalski%"] * 3
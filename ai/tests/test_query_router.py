@@ -0,0 +1,32 @@
+import json
+
+from src.agents.query_router import QueryRouter
+
+
+def _log_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_decision_log_is_truncated_to_the_sample_window(tmp_path):
+    log = tmp_path / "router_decisions.jsonl"
+    router = QueryRouter(decision_log=log, min_training_samples=2, retrain_every=5, max_samples=10)
+    for i in range(40):
+        router.record(f"question {i}", "YES" if i % 2 else "NO")
+
+    assert len(router._samples) == 10
+    assert len(_log_lines(log)) <= 10 + 5
+    assert router.stats()["training_samples"] == 10
+    assert sum(router.classifier.class_counts.values()) == 10
+
+
+def test_loading_an_oversized_log_keeps_the_newest_samples(tmp_path):
+    log = tmp_path / "router_decisions.jsonl"
+    with open(log, "w") as f:
+        for i in range(30):
+            f.write(json.dumps({"question": f"question {i}", "verdict": "YES" if i % 2 else "NO"}) + "\n")
+
+    router = QueryRouter(decision_log=log, min_training_samples=2, max_samples=10)
+
+    assert [question for question, _ in router._samples] == [f"question {i}" for i in range(20, 30)]
+    assert [record["question"] for record in _log_lines(log)] == [f"question {i}" for i in range(20, 30)]
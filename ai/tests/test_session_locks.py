@@ -0,0 +1,44 @@
+import asyncio
+
+from src.sessions.session_locks import SessionLocks
+
+
+def test_cancelled_waiter_keeps_the_lock_registered_until_it_finishes():
+    locks = SessionLocks(timeout=5)
+
+    async def scenario():
+        holder_entered = asyncio.Event()
+        release_holder = asyncio.Event()
+
+        async def holder():
+            async with locks.ahold("s1"):
+                holder_entered.set()
+                await release_holder.wait()
+
+        async def waiter():
+            async with locks.ahold("s1"):
+                pass
+
+        holder_task = asyncio.create_task(holder())
+        await holder_entered.wait()
+        waiter_task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)
+        waiter_task.cancel()
+        await asyncio.gather(waiter_task, return_exceptions=True)
+        # Wątek anulowanego oczekującego wciąż czeka na blokadę - wpis nie może zniknąć z rejestru
+        assert locks._locks["s1"][1] == 2
+
+        release_holder.set()
+        await holder_task
+        for _ in range(100):
+            if locks.stats()["active"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+        async with locks.ahold("s1"):
+            pass
+
+    asyncio.run(scenario())
+
+    assert locks.stats()["active"] == 0
+    assert locks.stats()["contended"] == 1
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.graphs import dynamic_rag_graph
+
+
+class FakeIndexStore:
+    def __init__(self):
+        self.vectorstore = object()
+
+    def get_vectorstore(self):
+        return self.vectorstore
+
+    def load(self):
+        return self.vectorstore
+
+    def as_retriever(self, vectorstore=None):
+        return SimpleNamespace(vectorstore=vectorstore)
+
+
+class FakeRAG:
+    def __init__(self, llm, retriever, vectorstore):
+        self.llm = llm
+        self.vectorstore = vectorstore
+
+
+@pytest.fixture
+def index_store(monkeypatch):
+    store = FakeIndexStore()
+    monkeypatch.setattr(dynamic_rag_graph, "get_index_store", lambda: store)
+    monkeypatch.setattr(dynamic_rag_graph, "AdaptiveRAG", FakeRAG)
+    dynamic_rag_graph._rags.clear()
+    yield store
+    dynamic_rag_graph._rags.clear()
+
+
+def test_attached_rag_uses_the_current_llm(index_store, monkeypatch):
+    old_llm, new_llm = object(), object()
+    dynamic_rag_graph.get_shared_rag(old_llm)
+    monkeypatch.setattr(dynamic_rag_graph, "SQLQueryEvaluatorAgent", lambda: SimpleNamespace(llm=new_llm))
+
+    rag, evaluator = dynamic_rag_graph._attached_rag()
+
+    assert rag.llm is new_llm
+    assert rag.vectorstore is index_store.vectorstore
+    assert evaluator.llm is new_llm
+
+
+def test_rags_for_different_llms_share_the_cache(index_store):
+    first_llm, second_llm = object(), object()
+    first = dynamic_rag_graph.get_shared_rag(first_llm)
+    second = dynamic_rag_graph.get_shared_rag(second_llm)
+
+    assert dynamic_rag_graph.get_shared_rag(first_llm) is first
+    assert dynamic_rag_graph.get_shared_rag(second_llm) is second
+
+
+def test_new_index_version_evicts_stale_rags(index_store):
+    llm = object()
+    old_rag = dynamic_rag_graph.get_shared_rag(llm)
+    index_store.vectorstore = object()
+
+    new_rag = dynamic_rag_graph.get_shared_rag(llm)
+
+    assert new_rag is not old_rag
+    assert list(dynamic_rag_graph._rags.values()) == [new_rag]
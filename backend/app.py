@@ -1,10 +1,11 @@
 import os
 import uuid
 import sys
+import json
 import requests
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from dotenv import load_dotenv
-from src.call_ai_service import call_ai_service
+from src.call_ai_service import call_ai_service, stream_ai_service
 from src.database import ConversationDB
 
 # Import shared logging system
@@ -112,6 +113,76 @@ def chat():
         logger.error(f"Unexpected error in chat endpoint: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def sse_event(data, event=None):
+    """Zakoduj zdarzenie Server-Sent Events."""
+    prefix = f"event: {event}\n" if event and event != "message" else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Strumieniowy czat: przekazuje tokeny z usługi AI jako Server-Sent Events,
+    a pełną odpowiedź zapisuje w bazie po zakończeniu strumienia.
+    """
+    if not db:
+        logger.error("Database not available")
+        return jsonify({"error": "Database service unavailable"}), 503
+
+    data = request.get_json(silent=True)
+    if not data:
+        logger.warning("No JSON data received in chat stream request")
+        return jsonify({"error": "No data provided"}), 400
+
+    message = data.get('message')
+    session_id = data.get('session_id') or str(uuid.uuid4())
+
+    if not message or not message.strip():
+        logger.warning(f"Empty message received from session {session_id}")
+        return jsonify({"error": "Message is required and cannot be empty"}), 400
+
+    ai_service_config = config_manager.get("ai_service")
+    logger.info(f"Streaming chat message for session {session_id[:8]}...")
+
+    def generate():
+        tokens = []
+        for event, payload in stream_ai_service({
+            "message": message,
+            "session_id": session_id
+        }, config=ai_service_config):
+            if event == "message":
+                tokens.append(payload.get("token", ""))
+                yield sse_event(payload)
+            elif event == "end":
+                response_text = payload.get("response") or "".join(tokens)
+                if not response_text:
+                    logger.warning("AI service returned empty response")
+                    yield sse_event({"error": "Empty response from AI service"}, event="error")
+                    return
+                try:
+                    db.save_conversation(session_id, message, response_text)
+                    logger.info(f"Conversation saved for session {session_id[:8]}")
+                except Exception as db_error:
+                    logger.error(f"Failed to save conversation: {str(db_error)}")
+                    # Kontynuuj mimo błędu zapisu do bazy
+                yield sse_event({
+                    "response": response_text,
+                    "session_id": session_id,
+                    "status": "success"
+                }, event="end")
+                return
+            else:
+                logger.error(f"AI service stream error: {payload.get('error')}")
+                yield sse_event(payload, event="error")
+                return
+        logger.error("AI service stream closed without an end event")
+        yield sse_event({"error": "AI service stream ended unexpectedly"}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route('/api/clear-conversation', methods=['POST'])
 def clear_conversation():
     """Czyści pamięć konwersacji i zapisuje aktualną sesję do bazy"""
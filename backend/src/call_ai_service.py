@@ -6,6 +6,7 @@ backend_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if backend_root not in sys.path:
     sys.path.insert(0, backend_root)
 
+import json
 import requests
 from config.logging import get_logger
 
@@ -92,6 +93,74 @@ def call_ai_service(endpoint, data, config=None):
         logger.error(f"Unexpected error when calling AI service: {str(e)}")
         return {"error": "Unexpected AI service error"}
 
+# Ta sama funkcja jest w frontend/src/api_client.py - tests/test_sse_events.py pilnuje zgodności
+def iter_sse_events(lines):
+    """
+    Rozbierz strumień Server-Sent Events na pary (event, dane JSON).
+    Zdarzenia bez nazwy mają event = "message".
+    """
+    event, data_lines = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
+
+def stream_ai_service(data, config=None):
+    """
+    Wywołuje strumieniowy czat usługi AI (/chat/stream) i oddaje kolejne zdarzenia
+    jako (event, dane): ("message", {"token": ...}), na końcu ("end", {...})
+    albo ("error", {"error": ...}).
+    """
+    if config:
+        ai_service_url = config.get('url', os.getenv("AI_SERVICE_URL"))
+        timeout = config.get('timeout', 120)
+    else:
+        ai_service_url = os.getenv("AI_SERVICE_URL")
+        timeout = 120
+
+    if not ai_service_url:
+        logger.error("AI service URL not configured")
+        yield "error", {"error": "AI service configuration missing"}
+        return
+
+    ai_service_url = ai_service_url.rstrip('/')
+    message = data.get('message', '')
+    session_id = data.get('session_id')
+
+    try:
+        logger.info(f"Streaming chat message from AI service for session {session_id[:8] if session_id else 'unknown'}")
+        with requests.post(
+            f"{ai_service_url}/chat/stream",
+            json={"message": message, "session_id": session_id},
+            stream=True,
+            timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            yield from iter_sse_events(response.iter_lines(decode_unicode=True))
+    except requests.exceptions.Timeout:
+        logger.error("Timeout when streaming from AI service")
+        yield "error", {"error": "AI service timeout - please try again"}
+    except requests.exceptions.ConnectionError:
+        logger.error("Connection error when streaming from AI service")
+        yield "error", {"error": "Cannot connect to AI service"}
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error when streaming from AI service: {str(e)}")
+        yield "error", {"error": f"AI service communication error: {str(e)}"}
+    except Exception as e:
+        logger.error(f"Unexpected error when streaming from AI service: {str(e)}")
+        yield "error", {"error": "Unexpected AI service error"}
+
 def change_ai_provider(provider, config=None):
     """
     Zmień providera AI (OpenAI/Gemini)
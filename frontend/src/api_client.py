@@ -1,5 +1,6 @@
 import sys
 import os
+import json
 import requests
 import streamlit as st
 
@@ -8,6 +9,30 @@ from .logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+# Kopia backend/src/call_ai_service.py:iter_sse_events (osobne obrazy Dockera, bez wspólnego pakietu) -
+# tests/test_sse_events.py pilnuje, żeby obie wersje były identyczne
+def iter_sse_events(lines):
+    """
+    Rozbierz strumień Server-Sent Events na pary (event, dane JSON).
+    Zdarzenia bez nazwy mają event = "message".
+    """
+    event, data_lines = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
+
 class ApiClient:
     def __init__(self, backend_url):
         self.backend_url = backend_url
@@ -120,6 +145,50 @@ class ApiClient:
             logger.error(f"Error sending message: {str(e)}")
             return {"error": f"Communication error: {str(e)}"}
 
+    def stream_message(self, message, session_id=None):
+        """
+        Wyślij wiadomość i odbieraj odpowiedź strumieniowo. Zwraca kolejne zdarzenia:
+        ("token", tekst), na końcu zawsze ("end", pełna odpowiedź) albo ("error", komunikat).
+        """
+        try:
+            if not message or not message.strip():
+                logger.warning("Attempted to send empty message")
+                yield "error", "Message cannot be empty"
+                return
+
+            logger.info(f"Streaming message for session: {session_id[:8] if session_id else 'unknown'}")
+            data = {
+                "message": message.strip(),
+                "session_id": session_id
+            }
+            with requests.post(f"{self.backend_url}/chat/stream", json=data, stream=True, timeout=120) as response:
+                if response.status_code != 200:
+                    logger.error(f"Message streaming failed: {response.status_code}")
+                    yield "error", response.json().get("error", f"Server error: {response.status_code}")
+                    return
+
+                for event, payload in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                    if event == "message":
+                        yield "token", payload.get("token", "")
+                    elif event == "end":
+                        logger.info("Message streamed successfully")
+                        yield "end", payload.get("response", "")
+                        return
+                    else:
+                        logger.error(f"Message streaming failed: {payload.get('error')}")
+                        yield "error", payload.get("error", "Unknown error")
+                        return
+
+                # Strumień zamknięty bez zdarzenia end/error - odpowiedź jest niekompletna
+                logger.error("Message stream closed before the response was complete")
+                yield "error", "Connection closed before the response was complete. Please try again."
+        except requests.exceptions.Timeout:
+            logger.error("Timeout streaming message")
+            yield "error", "Request timed out. Please try again."
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield "error", f"Communication error: {str(e)}"
+
     def clear_conversation(self):
         """Wyczyść konwersację w backendzie"""
         try:
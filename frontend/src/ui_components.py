@@ -199,6 +199,10 @@ class AppUI:
                 message_placeholder.markdown("Thinking...")
                 
                 try:
+                    if self.config.get('ui', {}).get('chat', {}).get('streaming', True):
+                        self.render_streamed_response(prompt, message_placeholder)
+                        return
+
                     response = self.api_client.send_message(
                         prompt,
                         st.session_state.current_session_id
@@ -216,6 +220,27 @@ class AppUI:
                     error_message = f"Error communicating with backend: {str(e)}"
                     message_placeholder.error(error_message)
 
+    def render_streamed_response(self, prompt, message_placeholder):
+        """Wyświetlaj odpowiedź asystenta przyrostowo, w miarę napływu tokenów"""
+        assistant_response = ""
+        for event, payload in self.api_client.stream_message(
+            prompt,
+            st.session_state.current_session_id
+        ):
+            if event == "token":
+                assistant_response += payload
+                message_placeholder.markdown(assistant_response + "▌")
+            elif event == "end":
+                assistant_response = payload or assistant_response
+                message_placeholder.markdown(assistant_response)
+                st.session_state.messages.append({"role": "assistant", "content": assistant_response})
+                return
+            else:
+                message_placeholder.error(f"Error: {payload}")
+                return
+        # Bez zdarzenia end odpowiedź nie jest kompletna - nie zapisujemy jej w historii
+        message_placeholder.error("Error: the response stream ended unexpectedly")
+
     def run(self):
         """Uruchom interfejs użytkownika aplikacji"""
         self.setup_sidebar()
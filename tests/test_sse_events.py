@@ -0,0 +1,51 @@
+"""
+Parser SSE istnieje w dwóch kopiach (backend i frontend to osobne obrazy) - obie
+muszą być identyczne. Funkcje są wyciągane ze źródeł przez ast, bez importu
+zależności serwisów (Flask, Streamlit).
+"""
+import ast
+import json
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+COPIES = [ROOT / "backend" / "src" / "call_ai_service.py", ROOT / "frontend" / "src" / "api_client.py"]
+
+
+def _function_node(path, name="iter_sse_events"):
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    return next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == name)
+
+
+def _load_function(path):
+    namespace = {"json": json}
+    exec(compile(ast.Module(body=[_function_node(path)], type_ignores=[]), str(path), "exec"), namespace)
+    return namespace["iter_sse_events"]
+
+
+def test_copies_are_identical():
+    backend, frontend = (ast.dump(_function_node(path)) for path in COPIES)
+    assert backend == frontend
+
+
+@pytest.mark.parametrize("path", COPIES, ids=["backend", "frontend"])
+def test_parses_named_and_default_events(path):
+    iter_sse_events = _load_function(path)
+    lines = [
+        'data: {"token": "Hel"}', "",
+        b'data: {"token": "lo"}', b"", None,
+        "event: end", 'data: {"response": "Hello"}', "",
+    ]
+    assert list(iter_sse_events(lines)) == [
+        ("message", {"token": "Hel"}),
+        ("message", {"token": "lo"}),
+        ("end", {"response": "Hello"}),
+    ]
+
+
+@pytest.mark.parametrize("path", COPIES, ids=["backend", "frontend"])
+def test_truncated_stream_has_no_terminal_event(path):
+    iter_sse_events = _load_function(path)
+    events = list(iter_sse_events(['data: {"token": "Hel"}', "", 'data: {"token": "lo"}']))
+    assert [event for event, _ in events] == ["message", "message"]